@@ -27,7 +27,7 @@ def recibir_archivo(puerto="/dev/ttyS0", baudrate=115200):
     ser.write(b"READY\n")
 
     # Recibir chunks
-    recibido = b""
+    recibido = bytearray()
     while len(recibido) < size:
         chunk = ser.read(256)
         if not chunk:
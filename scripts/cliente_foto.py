@@ -8,6 +8,7 @@ o automatizada, útil para desarrollo y diagnóstico.
 
 import sys
 import os
+import select
 import serial
 import time
 import threading
@@ -72,9 +73,10 @@ class ClienteUART:
         self.hilo_lectura: Optional[threading.Thread] = None
         
         # Buffer para respuestas
-        self.buffer_respuesta = ""
+        self.buffer_respuesta = bytearray()
         self.ultima_respuesta = ""
         self.esperando_respuesta = False
+        self._respuesta_cond = threading.Condition()  # avisa cada respuesta nueva
         
         # Estadísticas
         self.comandos_enviados = 0
@@ -124,7 +126,7 @@ class ClienteUART:
             
             # Esperar mensaje de bienvenida
             time.sleep(1.0)
-            if "CAMERA_READY" in self.buffer_respuesta:
+            if b"CAMERA_READY" in self.buffer_respuesta:
                 imprimir_color("📸 Sistema de cámara listo", Colores.GREEN)
             
             return True
@@ -156,22 +158,36 @@ class ClienteUART:
     
     def _bucle_lectura(self):
         """Bucle de lectura de respuestas UART."""
+        # select() necesita un descriptor POSIX; el Serial de Windows no tiene
+        # fileno() y ahí se bloquea en read() hasta el timeout del puerto (1 s)
+        try:
+            fd = self.conexion.fileno()
+        except (AttributeError, OSError):
+            fd = None
+        
         while self.ejecutando:
             try:
-                if self.conexion and self.conexion.in_waiting > 0:
-                    data = self.conexion.read(self.conexion.in_waiting)
-                    texto = data.decode('utf-8', errors='ignore')
-                    self.buffer_respuesta += texto
+                # Dormir en el kernel hasta que lleguen bytes (sin sondeo periódico)
+                if fd is not None:
+                    listos, _, _ = select.select([fd], [], [], 0.5)
+                else:
+                    listos = True
+                if listos:
+                    data = self.conexion.read(self.conexion.in_waiting or 1)
+                    buf = self.buffer_respuesta
+                    buf.extend(data)
                     
-                    # Procesar líneas completas
-                    while '\n' in self.buffer_respuesta:
-                        linea, self.buffer_respuesta = self.buffer_respuesta.split('\n', 1)
-                        linea = linea.strip()
-                        
+                    # Procesar líneas completas: buscar en bytes y decodificar solo cada línea
+                    inicio = 0
+                    fin = buf.find(b'\n')
+                    while fin >= 0:
+                        linea = buf[inicio:fin].decode('utf-8', errors='ignore').strip()
                         if linea:
                             self._procesar_respuesta(linea)
-                
-                time.sleep(0.05)
+                        inicio = fin + 1
+                        fin = buf.find(b'\n', inicio)
+                    
+                    del buf[:inicio]
                 
             except Exception as e:
                 if self.ejecutando:
@@ -185,8 +201,10 @@ class ClienteUART:
         Args:
             respuesta: Respuesta recibida del sistema
         """
-        self.ultima_respuesta = respuesta
-        self.respuestas_recibidas += 1
+        with self._respuesta_cond:
+            self.ultima_respuesta = respuesta
+            self.respuestas_recibidas += 1
+            self._respuesta_cond.notify_all()
         
         # Formatear respuesta según tipo
         if respuesta.startswith("OK"):
@@ -327,13 +345,11 @@ class ClienteUART:
         Returns:
             str: Última respuesta recibida o None
         """
-        inicio = time.time()
-        respuesta_inicial = self.respuestas_recibidas
-        
-        while (time.time() - inicio) < timeout:
-            if self.respuestas_recibidas > respuesta_inicial:
+        with self._respuesta_cond:
+            respuesta_inicial = self.respuestas_recibidas
+            if self._respuesta_cond.wait_for(
+                    lambda: self.respuestas_recibidas > respuesta_inicial, timeout):
                 return self.ultima_respuesta
-            time.sleep(0.1)
         
         return None
     
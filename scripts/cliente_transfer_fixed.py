@@ -192,7 +192,7 @@ class ClienteTransferCorregido:
     
     def _recibir_datos_chunked(self, tamaño_total: int) -> Optional[bytes]:
         """Recibe datos en chunks con confirmación ACK"""
-        datos_completos = b""
+        datos_completos = bytearray()
         chunk_num = 0
         
         try:
@@ -219,7 +219,7 @@ class ClienteTransferCorregido:
                     progreso = (len(datos_completos) / tamaño_total) * 100
                     print(f"📈 Progreso: {progreso:.1f}% ({chunk_num} chunks)")
             
-            return datos_completos
+            return bytes(datos_completos)
             
         except Exception as e:
             print(f"❌ Error recibiendo chunks: {e}")
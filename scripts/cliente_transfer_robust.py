@@ -11,6 +11,10 @@ import sys
 from pathlib import Path
 from typing import Optional, Tuple
 import hashlib
+import zlib
+
+# Máximo de chunks en vuelo que acepta este cliente (ventana deslizante)
+VENTANA_MAX = 8
 
 class ClienteTransferenciaRobusto:
     """Cliente robusto para transferencia de archivos por UART"""
@@ -22,6 +26,7 @@ class ClienteTransferenciaRobusto:
         self.archivo_actual = None
         self.bytes_recibidos = 0
         self.chunks_recibidos = 0
+        self._rx = bytearray()  # bytes leídos del puerto y aún no consumidos
         
     def conectar(self) -> bool:
         """Establece conexión UART"""
@@ -41,9 +46,13 @@ class ClienteTransferenciaRobusto:
                 print("❌ No se pudo abrir el puerto")
                 return False
             
+            # Buffer RX suficiente para chunks grandes (solo Windows; en Linux lo gestiona el kernel)
+            if hasattr(self.conexion, 'set_buffer_size'):
+                self.conexion.set_buffer_size(rx_size=16384)
+            
             # Limpiar buffers
             self.conexion.flush()
-            self.conexion.reset_input_buffer()
+            self._descartar_entrada()
             self.conexion.reset_output_buffer()
             
             print("✅ Conexión establecida")
@@ -61,8 +70,7 @@ class ClienteTransferenciaRobusto:
         """Cierra la conexión"""
         if self.conexion and self.conexion.is_open:
             try:
-                self._enviar_comando("salir")
-                time.sleep(0.5)
+                self._enviar_comando("salir")  # _enviar_comando ya drena con flush()
                 self.conexion.close()
                 print("👋 Conexión cerrada")
             except:
@@ -106,7 +114,8 @@ class ClienteTransferenciaRobusto:
                 print(f"❌ Header inválido: {header}")
                 return False
             
-            # Parsear header: TRANSFER_START|timestamp|size
+            # Parsear header: TRANSFER_START|timestamp|size[|ventana[|sha256]]
+            # "sha256" anuncia un trailer CHECKSUM|hex tras el último chunk
             partes = header.split("|")
             if len(partes) < 3:
                 print(f"❌ Formato de header inválido: {header}")
@@ -114,6 +123,8 @@ class ClienteTransferenciaRobusto:
             
             timestamp = partes[1]
             tamaño_archivo = int(partes[2])
+            ventana = min(int(partes[3]), VENTANA_MAX) if len(partes) > 3 and partes[3].isdigit() else 1
+            hash_rx = hashlib.sha256() if len(partes) > 4 and partes[4] == "sha256" else None
             
             print(f"📁 Archivo: {timestamp}.jpg ({tamaño_archivo} bytes)")
             
@@ -121,51 +132,93 @@ class ClienteTransferenciaRobusto:
             if not archivo_destino:
                 archivo_destino = f"recibido_{timestamp}.jpg"
             
-            # Paso 4: Confirmar listo para recibir
-            if not self._enviar_comando("READY"):
+            # Paso 4: Confirmar listo para recibir (READY|N activa la ventana deslizante)
+            if not self._enviar_comando(f"READY|{ventana}" if ventana > 1 else "READY"):
                 return False
             
             # Paso 5: Recibir chunks con verificación
-            datos_completos = b""
+            datos_completos = bytearray()
             chunk_esperado = 0
+            nack_pendiente = False
             
             with open(archivo_destino, "wb") as f:
                 while len(datos_completos) < tamaño_archivo:
                     # Leer header del chunk
                     chunk_header = self._leer_respuesta(timeout=5.0)
+                    if nack_pendiente and chunk_header and "CHUNK|" in chunk_header:
+                        # Tras descartar el buffer el header puede llegar pegado a restos binarios
+                        chunk_header = chunk_header[chunk_header.index("CHUNK|"):]
                     if not chunk_header or not chunk_header.startswith("CHUNK|"):
+                        if ventana > 1 and chunk_header is not None:
+                            # Flujo desalineado: pedir reenvío una vez y descartar restos
+                            if not nack_pendiente:
+                                print(f"⚠️ Header de chunk inválido, solicitando reenvío desde {chunk_esperado}")
+                                self._descartar_entrada()
+                                self._enviar_comando(f"NACK|{chunk_esperado}")
+                                nack_pendiente = True
+                            continue
                         print(f"❌ Header de chunk inválido: {chunk_header}")
                         return False
                     
-                    # Parsear: CHUNK|num|size
+                    # Parsear: CHUNK|num|size[|crc32]
                     header_partes = chunk_header.split("|")
                     chunk_num = int(header_partes[1])
                     chunk_size = int(header_partes[2])
                     
+                    if ventana > 1 and chunk_num != chunk_esperado:
+                        # Descartar el chunk para no perder la alineación del flujo
+                        self._leer_datos_binarios(chunk_size, timeout=5.0)
+                        if chunk_num < chunk_esperado:
+                            # Duplicado por reenvío: repetir la confirmación acumulada
+                            self._enviar_comando(f"ACK|{chunk_esperado - 1}")
+                        elif not nack_pendiente:
+                            print(f"❌ Chunk fuera de secuencia: esperado {chunk_esperado}, recibido {chunk_num}")
+                            self._enviar_comando(f"NACK|{chunk_esperado}")
+                            nack_pendiente = True
+                        continue
+                    
                     # Verificar secuencia
                     if chunk_num != chunk_esperado:
                         print(f"❌ Chunk fuera de secuencia: esperado {chunk_esperado}, recibido {chunk_num}")
                         self._enviar_comando("NACK")
                         continue
                     
-                    # Confirmar listo para chunk
-                    if not self._enviar_comando("CHUNK_READY"):
+                    # Confirmar listo para chunk (solo stop-and-wait)
+                    if ventana == 1 and not self._enviar_comando("CHUNK_READY"):
                         return False
                     
                     # Leer datos binarios del chunk
                     chunk_data = self._leer_datos_binarios(chunk_size, timeout=5.0)
                     if not chunk_data or len(chunk_data) != chunk_size:
                         print(f"❌ Error leyendo chunk {chunk_num}: {len(chunk_data) if chunk_data else 0}/{chunk_size} bytes")
-                        self._enviar_comando("NACK")
+                        if ventana > 1:
+                            self._descartar_entrada()
+                            self._enviar_comando(f"NACK|{chunk_esperado}")
+                            nack_pendiente = True
+                        else:
+                            self._enviar_comando("NACK")
+                        continue
+                    
+                    # Verificar CRC32 si el emisor lo incluyó
+                    if len(header_partes) > 3 and zlib.crc32(chunk_data) != int(header_partes[3], 16):
+                        print(f"❌ CRC inválido en chunk {chunk_num}, solicitando reenvío")
+                        if ventana > 1:
+                            self._enviar_comando(f"NACK|{chunk_esperado}")
+                            nack_pendiente = True
+                        else:
+                            self._enviar_comando("NACK")
                         continue
                     
                     # Escribir chunk al archivo
                     f.write(chunk_data)
                     datos_completos += chunk_data
+                    if hash_rx:
+                        hash_rx.update(chunk_data)
                     
-                    # Confirmar chunk recibido
-                    if not self._enviar_comando("ACK"):
+                    # Confirmar chunk recibido (ACK|N acumulativo con ventana)
+                    if not self._enviar_comando(f"ACK|{chunk_num}" if ventana > 1 else "ACK"):
                         return False
+                    nack_pendiente = False
                     
                     chunk_esperado += 1
                     self.chunks_recibidos += 1
@@ -175,16 +228,24 @@ class ClienteTransferenciaRobusto:
                         progreso = (len(datos_completos) / tamaño_archivo) * 100
                         print(f"📈 Progreso: {progreso:.1f}% ({chunk_esperado} chunks)")
             
-            # Paso 6: Confirmar transferencia completa
+            # Paso 6: Verificar el checksum calculado durante la recepción
+            if hash_rx:
+                checksum = self._leer_trailer_checksum()
+                if checksum != hash_rx.hexdigest():
+                    print(f"❌ Checksum SHA-256 no coincide: esperado {checksum}")
+                    self._enviar_comando("ERROR|CHECKSUM")
+                    return False
+            
+            # Paso 7: Confirmar transferencia completa
             if not self._enviar_comando("DONE"):
                 return False
             
-            # Paso 7: Esperar confirmación final
+            # Paso 8: Esperar confirmación final
             confirmacion = self._leer_respuesta(timeout=5.0)
             if confirmacion != "TRANSFER_OK":
                 print(f"⚠️ Confirmación inesperada: {confirmacion}")
             
-            # Paso 8: Verificar integridad
+            # Paso 9: Verificar integridad
             if len(datos_completos) == tamaño_archivo:
                 print(f"✅ Archivo recibido exitosamente: {archivo_destino}")
                 print(f"📊 Estadísticas: {len(datos_completos)} bytes, {self.chunks_recibidos} chunks")
@@ -197,6 +258,22 @@ class ClienteTransferenciaRobusto:
             print(f"❌ Error en transferencia: {e}")
             return False
     
+    def _leer_trailer_checksum(self, timeout: float = 5.0) -> Optional[str]:
+        """Lee el trailer CHECKSUM|hex, descartando chunks reenviados que lleguen antes"""
+        inicio = time.time()
+        
+        while time.time() - inicio < timeout:
+            linea = self._leer_respuesta(timeout=timeout)
+            if linea is None:
+                return None
+            if linea.startswith("CHECKSUM|"):
+                return linea.split("|", 1)[1]
+            if linea.startswith("CHUNK|"):
+                # Duplicado de un reenvío en vuelo: consumir sus datos
+                self._leer_datos_binarios(int(linea.split("|")[2]), timeout=timeout)
+        
+        return None
+    
     def _enviar_comando(self, comando: str) -> bool:
         """Envía un comando y verifica el envío"""
         try:
@@ -214,14 +291,25 @@ class ClienteTransferenciaRobusto:
             return False
     
     def _leer_respuesta(self, timeout: float = 5.0) -> Optional[str]:
-        """Lee una respuesta de texto con timeout"""
+        """Lee una línea de texto con timeout desde el buffer de recepción"""
         try:
             self.conexion.timeout = timeout
-            linea = self.conexion.readline()
-            
-            if linea:
-                return linea.decode('utf-8', errors='ignore').strip()
-            return None
+            limite = time.time() + timeout
+            
+            while True:
+                fin = self._rx.find(b"\n")
+                if fin >= 0:
+                    linea = self._rx[:fin].decode('utf-8', errors='ignore').strip()
+                    del self._rx[:fin + 1]
+                    return linea
+                
+                # Leer en bloque todo lo disponible (al menos 1 byte) en lugar
+                # del byte a byte de readline()
+                datos = self.conexion.read(max(1, self.conexion.in_waiting))
+                if not datos or time.time() > limite:
+                    self._rx += datos
+                    return None
+                self._rx += datos
             
         except Exception as e:
             print(f"❌ Error leyendo respuesta: {e}")
@@ -230,25 +318,28 @@ class ClienteTransferenciaRobusto:
     def _leer_datos_binarios(self, tamaño: int, timeout: float = 5.0) -> Optional[bytes]:
         """Lee datos binarios con timeout y verificación de tamaño"""
         try:
-            self.conexion.timeout = timeout
-            datos = b""
-            inicio = time.time()
+            # Lo que ya quedó en el buffer tras el header + el resto en una sola lectura
+            if len(self._rx) < tamaño:
+                self.conexion.timeout = timeout
+                self._rx += self.conexion.read(tamaño - len(self._rx))
             
-            while len(datos) < tamaño and (time.time() - inicio) < timeout:
-                restante = tamaño - len(datos)
-                chunk = self.conexion.read(min(restante, 256))
-                
-                if not chunk:
-                    break
-                
-                datos += chunk
+            if len(self._rx) < tamaño:
+                self._rx.clear()  # datos incompletos: se descartan
+                return None
             
-            return datos if len(datos) == tamaño else None
+            datos = bytes(self._rx[:tamaño])
+            del self._rx[:tamaño]
+            return datos
             
         except Exception as e:
             print(f"❌ Error leyendo datos binarios: {e}")
             return None
     
+    def _descartar_entrada(self):
+        """Descarta lo pendiente en el puerto y en el buffer de recepción"""
+        self.conexion.reset_input_buffer()
+        self._rx.clear()
+    
     def _esperar_mensaje(self, esperado: str, timeout: float = 5.0) -> bool:
         """Espera un mensaje específico"""
         inicio = time.time()
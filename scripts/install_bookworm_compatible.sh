@@ -731,7 +731,7 @@ formato = %(asctime)s - %(name)s - %(levelname)s - %(message)s
 
 [TRANSFERENCIA]
 # Configuración básica de transferencia
-chunk_size = 256
+# chunk_size sin definir: se deriva del baudrate
 timeout_chunk = 5.0
 max_reintentos = 3
 EOF
@@ -66,6 +66,7 @@ class SistemaCamaraUART:
         
         # Estado del sistema
         self.tiempo_inicio = 0.0
+        self._inicio_monotonic = 0.0  # base para el tiempo de actividad
         self.estadisticas_sistema = {
             'comandos_procesados': 0,
             'fotos_tomadas': 0,
@@ -77,6 +78,8 @@ class SistemaCamaraUART:
         # Control de hilos
         self.hilo_monitor: Optional[threading.Thread] = None
         self.hilo_mantenimiento: Optional[threading.Thread] = None
+        self._evento_parada = threading.Event()  # despierta las esperas al detener
+        self._descarga_lock = threading.Lock()  # una sola descarga por UART a la vez
         
         self.logger.info("SistemaCamaraUART inicializado")
     
@@ -355,19 +358,41 @@ class SistemaCamaraUART:
                 if not info_archivo:
                     return f"ERROR|FILE_NOT_FOUND|{nombre_archivo}"
                 
-                # Programar transferencia
-               
+                # Transferir fuera del hilo de lectura: READY/ACK/DONE llegan por
+                # ese hilo y el UART handler los entrega al protocolo vía on_line
                 from file_transfer_protocol import FileTransferProtocol
                 ftp = FileTransferProtocol(self.uart_handler, self.logger)
-                ok = ftp.enviar_archivo(info_archivo['ruta_completa'])
-                if ok:
-                    return f"DOWNLOAD_OK|{nombre_archivo}|{info_archivo['tamaño_bytes']}"
-                else:
-                    return f"ERROR|DOWNLOAD_FAILED|{nombre_archivo}"
-
+                
+                # Dos descargas a la vez intercalarían sus CHUNK en la línea
+                if not self._descarga_lock.acquire(blocking=False):
+                    return f"ERROR|BUSY|{nombre_archivo}"
+                
+                def transferir():
+                    try:
+                        self.uart_handler.on_line = ftp.procesar_mensaje_control
+                        try:
+                            ok = ftp.enviar_archivo(info_archivo['ruta_completa'])
+                        finally:
+                            # Quitar el hook solo si sigue siendo el de esta transferencia
+                            if self.uart_handler.on_line == ftp.procesar_mensaje_control:
+                                self.uart_handler.on_line = None
+                        
+                        if ok:
+                            self.estadisticas_sistema['archivos_transferidos'] += 1
+                            self.uart_handler.enviar_mensaje(f"DOWNLOAD_OK|{nombre_archivo}|{info_archivo['tamaño_bytes']}")
+                        else:
+                            self.uart_handler.enviar_mensaje(f"ERROR|DOWNLOAD_FAILED|{nombre_archivo}")
+                    finally:
+                        self._descarga_lock.release()
+                
+                try:
+                    threading.Thread(target=transferir, daemon=True).start()
+                except Exception:
+                    self._descarga_lock.release()
+                    raise
                 
                 self.estadisticas_sistema['comandos_procesados'] += 1
-                return f"DOWNLOAD_STARTED|{id_transferencia}|{info_archivo['tamaño_bytes']}"
+                return None  # la respuesta la envía el hilo de transferencia
                 
             except Exception as e:
                 return f"ERROR|DOWNLOAD_FAILED|{str(e)}"
@@ -851,7 +876,9 @@ class SistemaCamaraUART:
             
             # Iniciar hilos de monitoreo
             self.ejecutando = True
+            self._evento_parada.clear()
             self.tiempo_inicio = time.time()
+            self._inicio_monotonic = time.monotonic()
             
             self.hilo_monitor = threading.Thread(target=self._bucle_monitor, daemon=True)
             self.hilo_monitor.start()
@@ -872,6 +899,7 @@ class SistemaCamaraUART:
         self.logger.info("Deteniendo sistema de cámara UART...")
         
         self.ejecutando = False
+        self._evento_parada.set()
         
         # Detener componentes
         if self.uart_handler:
@@ -912,26 +940,26 @@ class SistemaCamaraUART:
         while self.ejecutando:
             try:
                 # Actualizar estadísticas
-                self.estadisticas_sistema['tiempo_actividad'] = time.time() - self.tiempo_inicio
+                self.estadisticas_sistema['tiempo_actividad'] = self._tiempo_actividad()
                 
                 # Log periódico de estado
                 if int(self.estadisticas_sistema['tiempo_actividad']) % 300 == 0:  # Cada 5 minutos
                     self.logger.info(f"Sistema activo: {self.obtener_estadisticas_resumidas()}")
                 
-                time.sleep(60)  # Monitor cada minuto
+                if self._evento_parada.wait(60):  # Monitor cada minuto
+                    break
                 
             except Exception as e:
                 self.logger.error(f"Error en bucle monitor: {e}")
-                time.sleep(60)
+                if self._evento_parada.wait(60):
+                    break
     
     def _bucle_mantenimiento(self):
         """Bucle de mantenimiento del sistema."""
         while self.ejecutando:
             try:
                 # Mantenimiento cada hora
-                time.sleep(3600)
-                
-                if not self.ejecutando:
+                if self._evento_parada.wait(3600):
                     break
                 
                 self.logger.info("Ejecutando mantenimiento del sistema...")
@@ -966,7 +994,7 @@ class SistemaCamaraUART:
             'sistema': {
                 'ejecutando': self.ejecutando,
                 'tiempo_inicio': self.tiempo_inicio,
-                'tiempo_actividad': time.time() - self.tiempo_inicio if self.tiempo_inicio > 0 else 0,
+                'tiempo_actividad': self._tiempo_actividad(),
                 'estadisticas': self.estadisticas_sistema.copy()
             },
             'configuracion': self.config_manager.obtener_info_sistema() if self.config_manager else {},
@@ -984,9 +1012,13 @@ class SistemaCamaraUART:
             'comandos_procesados': self.estadisticas_sistema['comandos_procesados'],
             'archivos_transferidos': self.estadisticas_sistema['archivos_transferidos'],
             'errores_totales': self.estadisticas_sistema['errores_totales'],
-            'tiempo_actividad': time.time() - self.tiempo_inicio if self.tiempo_inicio > 0 else 0
+            'tiempo_actividad': self._tiempo_actividad()
         }
     
+    def _tiempo_actividad(self) -> float:
+        """Segundos desde el inicio, inmune a saltos del reloj (NTP)."""
+        return time.monotonic() - self._inicio_monotonic if self.tiempo_inicio > 0 else 0
+    
     def _guardar_estadisticas_finales(self):
         """Guarda estadísticas finales al detener el sistema."""
         try:
@@ -994,7 +1026,7 @@ class SistemaCamaraUART:
             
             estadisticas_finales = {
                 'timestamp_cierre': datetime.now().isoformat(),
-                'tiempo_total_ejecucion': time.time() - self.tiempo_inicio if self.tiempo_inicio > 0 else 0,
+                'tiempo_total_ejecucion': self._tiempo_actividad(),
                 'estado_completo': self.obtener_estado_completo()
             }
             
@@ -1013,7 +1045,7 @@ class SistemaCamaraUART:
             
             while self.ejecutando:
                 try:
-                    time.sleep(1.0)
+                    self._evento_parada.wait(1.0)
                 except KeyboardInterrupt:
                     self.logger.info("Interrupción por teclado recibida")
                     break
@@ -20,6 +20,9 @@ except ImportError:
     PICAMERA_AVAILABLE = False
     Picamera2 = None
 
+# Extensiones que cuentan como fotos en el directorio de capturas
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp')
+
 class CamaraController:
     """
     Controlador de cámara compatible con rpicam-apps (Raspberry Pi OS Bookworm)
@@ -200,7 +203,7 @@ class CamaraController:
                 info_captura.tamaño_bytes = tamaño_bytes
                 info_captura.timestamp = timestamp
                 info_captura.resolucion = self.resolucion_default
-                info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+                info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
                 
                 self.logger.info(f"Foto capturada con {self.cmd_still}: {nombre_archivo} ({tamaño_bytes} bytes)")
             else:
@@ -212,7 +215,7 @@ class CamaraController:
             self.logger.error(f"Error en captura con comandos del sistema: {e}")
             info_captura.exito = False
             info_captura.error = str(e)
-            info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+            info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
         
         # Actualizar estadísticas
         if info_captura.exito:
@@ -262,7 +265,7 @@ class CamaraController:
             info_captura.tamaño_bytes = tamaño_bytes
             info_captura.timestamp = timestamp
             info_captura.resolucion = self.resolucion_default
-            info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+            info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
             
             self.logger.info(f"Foto capturada con picamera2: {nombre_archivo} ({tamaño_bytes} bytes)")
             
@@ -270,7 +273,7 @@ class CamaraController:
             self.logger.error(f"Error en captura con picamera2: {e}")
             info_captura.exito = False
             info_captura.error = str(e)
-            info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+            info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
             
         finally:
             if picam2 is not None:
@@ -317,7 +320,7 @@ class CamaraController:
             info_captura.tamaño_bytes = tamaño_bytes
             info_captura.timestamp = timestamp
             info_captura.resolucion = self.resolucion_default
-            info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+            info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
             
             self.logger.info(f"Foto simulada creada: {nombre_archivo} ({tamaño_bytes} bytes)")
             
@@ -325,7 +328,7 @@ class CamaraController:
             self.logger.error(f"Error creando foto simulada: {e}")
             info_captura.exito = False
             info_captura.error = str(e)
-            info_captura.tiempo_captura = time.time() - info_captura.tiempo_inicio
+            info_captura.tiempo_captura = time.monotonic() - info_captura.tiempo_inicio
         
         # Actualizar estadísticas
         if info_captura.exito:
@@ -440,7 +443,7 @@ class CamaraController:
                 return archivos
             
             # Buscar archivos de imagen
-            extensiones = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
+            extensiones = ['*' + ext for ext in EXTENSIONES_IMAGEN]
             for extension in extensiones:
                 for archivo in directorio_path.glob(extension):
                     try:
@@ -464,6 +467,18 @@ class CamaraController:
             self.logger.error(f"Error listando archivos: {e}")
             return []
     
+    def contar_archivos(self) -> int:
+        """Cuenta las fotos del directorio (un solo scandir, sin stat por archivo)"""
+        try:
+            with os.scandir(self.directorio) as entradas:
+                return sum(1 for e in entradas
+                           if e.name.endswith(EXTENSIONES_IMAGEN) and e.is_file())
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            self.logger.error(f"Error contando archivos: {e}")
+            return 0
+    
     def obtener_info_archivo(self, nombre_archivo: str) -> Optional[Dict[str, Any]]:
         """Obtiene información de un archivo específico"""
         try:
@@ -547,9 +562,9 @@ class CamaraController:
     def realizar_captura_test(self) -> Dict[str, Any]:
         """Realiza una captura de prueba"""
         try:
-            inicio = time.time()
+            inicio = time.monotonic()
             info_captura = self.tomar_foto("test_captura")
-            tiempo_captura = time.time() - inicio
+            tiempo_captura = time.monotonic() - inicio
             
             resultado = {
                 'exito': info_captura.exito,
@@ -596,7 +611,7 @@ class CamaraController:
             },
             'archivos': {
                 'directorio': self.directorio,
-                'total_archivos': len(self.listar_archivos())
+                'total_archivos': self.contar_archivos()
             },
             'comandos_sistema': self.obtener_info_sistema_camara()['comandos_disponibles']
         }
@@ -627,7 +642,7 @@ class InfoCaptura:
         self.timestamp = ""
         self.resolucion = (0, 0)
         self.error = ""
-        self.tiempo_inicio = time.time()
+        self.tiempo_inicio = time.monotonic()
         self.tiempo_captura = 0.0
 
 
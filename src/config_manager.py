@@ -60,8 +60,8 @@ class ConfigManager:
             'backup_count': '5'
         }
         
+        # Sin chunk_size: si no se configura, se deriva del baudrate
         self.config['TRANSFERENCIA'] = {
-            'chunk_size': '256',
             'timeout_chunk': '5.0',
             'max_reintentos': '3',
             'verificar_checksum': 'true',
@@ -116,7 +116,9 @@ class ConfigManager:
         # Objeto transferencia
         class TransferenciaConfig:
             def __init__(self, config_manager):
-                self.chunk_size = int(config_manager.get('TRANSFERENCIA', 'chunk_size', '256'))
+                # None si no está configurado: FileTransferProtocol lo deriva del baudrate
+                chunk_size = config_manager.get('TRANSFERENCIA', 'chunk_size')
+                self.chunk_size = int(chunk_size) if chunk_size else None
                 self.timeout_chunk = float(config_manager.get('TRANSFERENCIA', 'timeout_chunk', '5.0'))
                 self.max_reintentos = int(config_manager.get('TRANSFERENCIA', 'max_reintentos', '3'))
                 self.verificar_checksum = config_manager.get('TRANSFERENCIA', 'verificar_checksum', 'true').lower() == 'true'
@@ -217,6 +219,12 @@ class ConfigManager:
         if self.uart.baudrate not in self.obtener_velocidades_disponibles():
             errores.append(f"Baudrate no válido: {self.uart.baudrate}")
         
+        # Validar tamaño de chunk: FileTransferProtocol lo usa tal cual y
+        # rechaza los que no son potencia de dos
+        chunk_size = self.transferencia.chunk_size
+        if chunk_size is not None and (chunk_size <= 0 or chunk_size & (chunk_size - 1)):
+            errores.append(f"chunk_size debe ser potencia de dos: {chunk_size}")
+        
         # Validar directorio de fotos
         try:
             Path(self.camara.directorio).mkdir(parents=True, exist_ok=True)
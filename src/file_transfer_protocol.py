@@ -1,77 +1,154 @@
 # file_transfer_protocol_fixed.py
+import hashlib
+import mmap
 import time
+import zlib
 import threading
+from contextlib import contextmanager
 from pathlib import Path
-from queue import Queue, Empty
+from typing import Dict, Optional, Tuple
 
-CHUNK_SIZE = 256
+CHUNK_SIZE = 4096
+CHUNK_SIZE_MIN = 256
+CHUNK_SIZE_MAX = 8192
+TIEMPO_CHUNK_OBJETIVO = 0.5  # segundos de línea por chunk
+VENTANA = 8  # chunks en vuelo sin confirmar (1 = stop-and-wait)
+LECTURA_COMPLETA_MAX = 16 * 1024 * 1024  # hasta este tamaño el archivo se lee de una vez
+
+def chunk_size_para_baudrate(baudrate: int) -> int:
+    """Potencia de dos que ocupa ~TIEMPO_CHUNK_OBJETIVO en la línea (8N1 = 10 bits/byte)"""
+    objetivo = int(baudrate / 10 * TIEMPO_CHUNK_OBJETIVO)
+    if objetivo < CHUNK_SIZE_MIN:
+        return CHUNK_SIZE_MIN
+    return min(1 << (objetivo.bit_length() - 1), CHUNK_SIZE_MAX)
+
+@contextmanager
+def _vista_archivo(archivo: Path, tamaño: int):
+    """memoryview del contenido: una sola lectura si es pequeño, mmap si no"""
+    if tamaño <= LECTURA_COMPLETA_MAX:
+        with memoryview(archivo.read_bytes()) as datos:
+            yield datos
+        return
+    
+    with open(archivo, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(mapa) as datos:
+                yield datos
+        except BaseException:
+            # El traceback aún retiene slices del mapa: close() lanzaría
+            # BufferError y ocultaría el error original de la transferencia
+            try:
+                mapa.close()
+            except BufferError:
+                pass
+            raise
+        mapa.close()
 
 class FileTransferProtocol:
-    def __init__(self, uart_handler, logger=None):
+    # Mensajes de control de transferencia: exactos o con parámetros "TIPO|..."
+    _CTRL_EXACT = frozenset({"READY", "CHUNK_READY", "ACK", "DONE", "NACK", "ERROR"})
+    _CTRL_PREFIX = tuple(f"{t}|" for t in _CTRL_EXACT)
+
+    def __init__(self, uart_handler, logger=None, chunk_size: int = None, ventana: int = VENTANA):
         self.uart = uart_handler
         self.logger = logger
-        # Cola para respuestas de control
-        self.respuestas_control = Queue()
+        # Tamaño de chunk: explícito, de transferencia.chunk_size o, si la
+        # configuración no lo define, derivado de la velocidad UART
+        if chunk_size is None:
+            try:
+                chunk_size = self.uart.config.transferencia.chunk_size
+            except AttributeError:
+                pass
+        if chunk_size is None:
+            try:
+                chunk_size = chunk_size_para_baudrate(self.uart.config.uart.baudrate)
+            except AttributeError:
+                chunk_size = CHUNK_SIZE
+        # Potencia de dos: índices y offsets se calculan con shifts
+        if not isinstance(chunk_size, int) or chunk_size <= 0 or chunk_size & (chunk_size - 1):
+            raise ValueError(f"chunk_size debe ser potencia de dos: {chunk_size}")
+        self._chunk_shift = chunk_size.bit_length() - 1
+        self.chunk_size = chunk_size
+        self.ventana = max(1, ventana)
+        try:
+            self.verificar_checksum = self.uart.config.transferencia.verificar_checksum
+        except AttributeError:
+            self.verificar_checksum = True
+        # Respuestas de control: último mensaje por tipo + Event para despertar
+        # al único consumidor (el hilo que transfiere) sin sondeo periódico
+        self._respuestas: Dict[str, str] = {}
+        self._resp_lock = threading.Lock()
+        self._resp_event = threading.Event()
         self.transfer_lock = threading.Lock()
+        self._bytes_chunks = 0  # bytes de chunks escritos en la transferencia en curso
 
     def enviar_archivo(self, ruta_archivo: str) -> bool:
         """Implementa el protocolo de transferencia chunked con ACK/DONE corregido"""
         archivo = Path(ruta_archivo)
-        if not archivo.exists():
+        try:
+            # Un único stat(): existencia y tamaño a la vez
+            tamaño = archivo.stat().st_size
+        except FileNotFoundError:
             self.uart.enviar_mensaje(f"ERROR|FILE_NOT_FOUND|{archivo.name}")
             return False
 
         with self.transfer_lock:  # Evitar transferencias concurrentes
-            return self._enviar_archivo_interno(archivo)
+            return self._enviar_archivo_interno(archivo, tamaño)
 
-    def _enviar_archivo_interno(self, archivo: Path) -> bool:
+    def _enviar_archivo_interno(self, archivo: Path, tamaño: int) -> bool:
         """Implementación interna de transferencia"""
-        tamaño = archivo.stat().st_size
         timestamp = time.strftime("%Y%m%d_%H%M%S")
 
         try:
             # Paso 1: Limpiar cola de respuestas
             self._limpiar_cola_respuestas()
+            self._bytes_chunks = 0
             
-            # Paso 2: Enviar header
-            header = f"TRANSFER_START|{timestamp}|{tamaño}"
+            # Paso 2: Enviar header (cuarto campo: ventana; quinto: algoritmo del
+            # checksum, que llega como trailer CHECKSUM|hex tras el último chunk)
+            header = f"TRANSFER_START|{timestamp}|{tamaño}|{self.ventana}"
+            if self.verificar_checksum:
+                header += "|sha256"
             self.uart.enviar_mensaje(header)
             if self.logger:
                 self.logger.info(f"Header enviado: {header}")
 
             # Paso 3: Esperar READY con timeout mejorado
-            if not self._esperar_respuesta_control("READY", timeout=10.0):
+            respuesta = self._esperar_respuesta_control("READY", timeout=10.0)
+            if not respuesta:
                 self._error("READY no recibido en tiempo")
                 return False
 
-            # Paso 4: Enviar chunks con verificación robusta
-            with open(archivo, "rb") as f:
-                chunk_num = 0
-                bytes_enviados = 0
-                
-                while True:
-                    chunk = f.read(CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    
-                    # Enviar chunk con número de secuencia
-                    if not self._enviar_chunk_con_verificacion(chunk, chunk_num):
-                        self._error(f"Error enviando chunk {chunk_num}")
-                        return False
-                    
-                    bytes_enviados += len(chunk)
-                    chunk_num += 1
-                    
-                    if self.logger and chunk_num % 50 == 0:
-                        progreso = (bytes_enviados / tamaño) * 100
-                        self.logger.debug(f"Progreso: {progreso:.1f}% ({chunk_num} chunks)")
-
-            # Paso 5: Esperar DONE final
-            if not self._esperar_respuesta_control("DONE", timeout=10.0):
-                self._error("DONE no recibido")
+            # READY|N: el receptor acepta ventana deslizante de N chunks.
+            # READY a secas: receptor antiguo, se usa stop-and-wait.
+            _, _, ventana_receptor = respuesta.partition("|")
+            ventana = min(self.ventana, int(ventana_receptor)) if ventana_receptor.isdigit() else 1
+
+            # Paso 4: Enviar chunks con verificación robusta. Cada chunk es
+            # un slice del memoryview del archivo, sin copias intermedias, y
+            # el checksum se calcula en la misma pasada.
+            hasher = hashlib.sha256() if self.verificar_checksum else None
+            with _vista_archivo(archivo, tamaño) as datos:
+                if ventana > 1:
+                    enviado = self._enviar_chunks_ventana(datos, ventana, hasher)
+                else:
+                    enviado = self._enviar_chunks_secuencial(datos, hasher)
+            
+            if not enviado:
                 return False
 
-            # Paso 6: Confirmar fin exitoso
+            # Paso 5: Trailer con el checksum del archivo
+            if hasher:
+                self.uart.enviar_mensaje(f"CHECKSUM|{hasher.hexdigest()}")
+
+            # Paso 6: Esperar DONE final (ERROR si el receptor rechaza el checksum)
+            respuesta = self._tomar_respuesta_control(("ERROR", "DONE"), timeout=10.0)
+            if not respuesta or not respuesta.startswith("DONE"):
+                self._error(f"Receptor rechazó la transferencia: {respuesta}" if respuesta else "DONE no recibido")
+                return False
+
+            # Paso 7: Confirmar fin exitoso
             self.uart.enviar_mensaje("TRANSFER_OK")
             if self.logger:
                 self.logger.info(f"Transferencia completada: {archivo.name} ({tamaño} bytes)")
@@ -80,16 +157,115 @@ class FileTransferProtocol:
         except Exception as e:
             self._error(f"Excepción durante transferencia: {e}")
             return False
+        finally:
+            # Estadísticas del handler: una sola suma por transferencia
+            if self._bytes_chunks:
+                self.uart._sumar_bytes_enviados(self._bytes_chunks)
+                self._bytes_chunks = 0
+
+    def _enviar_chunks_secuencial(self, datos: memoryview, hasher=None) -> bool:
+        """Stop-and-wait: un chunk, CHUNK_READY, ACK y el siguiente"""
+        tamaño = len(datos)
+        
+        for chunk_num, offset in enumerate(range(0, tamaño, self.chunk_size)):
+            chunk = datos[offset:offset + self.chunk_size]
+            
+            # Enviar chunk con número de secuencia
+            if not self._enviar_chunk_con_verificacion(chunk, chunk_num):
+                self._error(f"Error enviando chunk {chunk_num}")
+                return False
+            if hasher:
+                hasher.update(chunk)
+            
+            if self.logger and (chunk_num + 1) % 50 == 0:
+                progreso = (offset + len(chunk)) / tamaño * 100
+                self.logger.debug("Progreso: %.1f%% (%d chunks)", progreso, chunk_num + 1)
+        
+        return True
 
-    def _enviar_chunk_con_verificacion(self, chunk: bytes, chunk_num: int) -> bool:
+    def _enviar_chunks_ventana(self, datos: memoryview, ventana: int, hasher=None) -> bool:
+        """
+        Ventana deslizante: hasta `ventana` chunks en vuelo sin CHUNK_READY.
+        
+        El receptor confirma con ACK|N (último chunk contiguo recibido) y
+        pide reenvío con NACK|N; un timeout reenvía desde el primer chunk
+        sin confirmar (go-back-N).
+        """
+        MAX_REINTENTOS = 3
+        tamaño = len(datos)
+        total_chunks = (tamaño + self.chunk_size - 1) >> self._chunk_shift
+        base = 0          # primer chunk sin confirmar
+        siguiente = 0     # próximo chunk a escribir
+        reintentos = 0
+        hasheados = 0     # chunks ya incluidos en el checksum (solo en su primer envío)
+        
+        while base < total_chunks:
+            # Llenar la ventana (un reenvío es solo volver a cortar el mapa)
+            while siguiente < total_chunks and siguiente - base < ventana:
+                offset = siguiente << self._chunk_shift
+                chunk = datos[offset:offset + self.chunk_size]
+                self._enviar_chunk_raw(chunk, siguiente)
+                if hasher and siguiente == hasheados:
+                    hasher.update(chunk)
+                    hasheados += 1
+                siguiente += 1
+            
+            # ACK antes que NACK: un NACK ya superado por un ACK posterior se descarta
+            respuesta = self._tomar_respuesta_control(("ERROR", "ACK", "NACK"), timeout=5.0)
+            tipo, _, numero = respuesta.partition("|") if respuesta else ("", "", "")
+            
+            if tipo == "ERROR":
+                self._error(f"Receptor abortó la transferencia: {respuesta}")
+                return False
+            
+            if not numero.isdigit():
+                if respuesta is not None:
+                    continue  # ACK/NACK sin número: no aplica a la ventana
+                reintentos += 1
+                if reintentos >= MAX_REINTENTOS:
+                    self._error(f"Timeout esperando ACK del chunk {base}")
+                    return False
+                if self.logger:
+                    self.logger.warning(f"Timeout esperando ACK, reenviando desde chunk {base}")
+                siguiente = base
+                continue
+            
+            # ACK|N confirma hasta N inclusive; NACK|N confirma hasta N-1
+            n = int(numero)
+            confirmados = min(n + 1 if tipo == "ACK" else n, siguiente)
+            if confirmados > base:
+                base = confirmados
+                reintentos = 0
+            
+            if tipo == "NACK" and n >= base:
+                reintentos += 1
+                if reintentos >= MAX_REINTENTOS:
+                    self._error(f"Demasiados NACK para el chunk {n}")
+                    return False
+                if self.logger:
+                    self.logger.warning(f"NACK recibido, reenviando desde chunk {n}")
+                siguiente = base
+            
+            if self.logger and base and base % 50 == 0:
+                progreso = min(base << self._chunk_shift, tamaño) / tamaño * 100
+                self.logger.debug("Progreso: %.1f%% (%d chunks)", progreso, base)
+        
+        return True
+
+    def _enviar_chunk_raw(self, chunk: memoryview, chunk_num: int):
+        """Escribe header (con CRC32 de los datos) y datos del chunk en el puerto"""
+        crc = zlib.crc32(chunk)
+        self._bytes_chunks += self.uart._write_raw(
+            f"CHUNK|{chunk_num}|{len(chunk)}|{crc:08x}\r\n".encode(), chunk)
+
+    def _enviar_chunk_con_verificacion(self, chunk: memoryview, chunk_num: int) -> bool:
         """Envía un chunk con verificación y reintentos"""
         MAX_REINTENTOS = 3
         
         for intento in range(MAX_REINTENTOS):
             try:
-                # Enviar header del chunk
-                chunk_header = f"CHUNK|{chunk_num}|{len(chunk)}"
-                self.uart.enviar_mensaje(chunk_header)
+                # Enviar header y datos binarios
+                self._enviar_chunk_raw(chunk, chunk_num)
                 
                 # Esperar confirmación de header
                 if not self._esperar_respuesta_control("CHUNK_READY", timeout=5.0):
@@ -99,14 +275,15 @@ class FileTransferProtocol:
                         continue
                     return False
                 
-                # Enviar datos binarios
-                self.uart.conexion.write(chunk)
-                self.uart.conexion.flush()
-                
-                # Esperar ACK
-                if self._esperar_respuesta_control("ACK", timeout=5.0):
+                # Esperar ACK (NACK por CRC/tamaño: reintentar sin esperar timeout)
+                respuesta = self._tomar_respuesta_control(("ACK", "NACK"), timeout=5.0)
+                if respuesta and respuesta.startswith("ACK"):
                     return True
                 
+                if respuesta and intento < MAX_REINTENTOS - 1:
+                    self.logger.warning(f"NACK para chunk {chunk_num}, reintentando...")
+                    continue
+                
                 if intento < MAX_REINTENTOS - 1:
                     self.logger.warning(f"ACK no recibido para chunk {chunk_num}, reintentando...")
                     time.sleep(0.5)
@@ -119,45 +296,45 @@ class FileTransferProtocol:
         
         return False
 
-    def _esperar_respuesta_control(self, esperado: str, timeout: float = 5.0) -> bool:
-        """Espera respuesta usando cola dedicada - SIN busy waiting"""
-        inicio = time.time()
-        
-        while time.time() - inicio < timeout:
-            try:
-                # Usar timeout corto para permitir verificación de tiempo
-                respuesta = self.respuestas_control.get(timeout=0.1)
-                
-                if respuesta.strip() == esperado:
-                    return True
-                else:
-                    # Respuesta inesperada
-                    self.logger.warning(f"Respuesta inesperada: esperaba '{esperado}', recibido '{respuesta}'")
-                    
-            except Empty:
-                continue  # Timeout de cola, continuar esperando
-        
-        self.logger.error(f"Timeout esperando '{esperado}' ({timeout}s)")
-        return False
+    def _esperar_respuesta_control(self, esperado: str, timeout: float = 5.0) -> Optional[str]:
+        """Espera `esperado` (o `esperado|...`) y devuelve el mensaje, o None por timeout"""
+        respuesta = self._tomar_respuesta_control((esperado,), timeout)
+        if respuesta is None and self.logger:
+            self.logger.error(f"Timeout esperando '{esperado}' ({timeout}s)")
+        return respuesta
+
+    def _tomar_respuesta_control(self, tipos: Tuple[str, ...], timeout: float = 5.0) -> Optional[str]:
+        """Consume la respuesta pendiente del primer tipo de `tipos` que haya llegado"""
+        limite = time.monotonic() + timeout
+        while True:
+            with self._resp_lock:
+                for tipo in tipos:
+                    respuesta = self._respuestas.pop(tipo, None)
+                    if respuesta is not None:
+                        return respuesta
+                # Limpiar bajo el lock: un set() posterior no se pierde
+                self._resp_event.clear()
+            
+            restante = limite - time.monotonic()
+            if restante <= 0 or not self._resp_event.wait(restante):
+                return None
 
     def _limpiar_cola_respuestas(self):
-        """Limpia la cola de respuestas antes de iniciar transferencia"""
-        while not self.respuestas_control.empty():
-            try:
-                self.respuestas_control.get_nowait()
-            except Empty:
-                break
+        """Descarta respuestas pendientes antes de iniciar transferencia"""
+        with self._resp_lock:
+            self._respuestas.clear()
+            self._resp_event.clear()
 
-    def procesar_mensaje_control(self, mensaje: str):
-        """Método para que el UART handler inyecte mensajes de control"""
+    def procesar_mensaje_control(self, mensaje: str) -> bool:
+        """Método para que el UART handler inyecte mensajes de control; True si lo consumió"""
         # Filtrar solo mensajes de transferencia
-        mensajes_transferencia = ["READY", "CHUNK_READY", "ACK", "DONE", "NACK", "ERROR"]
-        
-        mensaje_clean = mensaje.strip()
-        for msg_tipo in mensajes_transferencia:
-            if mensaje_clean == msg_tipo or mensaje_clean.startswith(f"{msg_tipo}|"):
-                self.respuestas_control.put(mensaje_clean)
-                break
+        m = mensaje.strip()
+        if m in self._CTRL_EXACT or m.startswith(self._CTRL_PREFIX):
+            with self._resp_lock:
+                self._respuestas[m.partition("|")[0]] = m
+                self._resp_event.set()
+            return True
+        return False
 
     def _error(self, msg):
         """Log de error y notificación al cliente"""
@@ -177,29 +354,8 @@ class UARTHandlerWithTransfer:
         """Configura el protocolo de transferencia"""
         self.transfer_protocol = FileTransferProtocol(self.uart_original, logger)
         
-        # Interceptar mensajes de control para transferencias
-        self._hook_mensaje_processor()
-        
-    def _hook_mensaje_processor(self):
-        """Intercepta el procesador de mensajes original"""
-        original_procesar = self.uart_original._procesar_datos_recibidos
-        
-        def procesar_con_transferencia(data: bytes):
-            # Procesar normalmente
-            original_procesar(data)
-            
-            # Si hay transferencia activa, procesar mensajes de control
-            if self.transfer_protocol:
-                try:
-                    texto = data.decode('utf-8', errors='ignore')
-                    for linea in texto.split('\n'):
-                        if linea.strip():
-                            self.transfer_protocol.procesar_mensaje_control(linea.strip())
-                except:
-                    pass  # Ignorar errores de decodificación
-        
-        # Reemplazar método
-        self.uart_original._procesar_datos_recibidos = procesar_con_transferencia
+        # Recibir las líneas de control ya decodificadas por el UART handler
+        self.uart_original.on_line = self.transfer_protocol.procesar_mensaje_control
     
     def enviar_archivo(self, ruta_archivo: str) -> bool:
         """Proxy al protocolo de transferencia"""
@@ -2,13 +2,46 @@
 Manejador UART Simplificado - Compatible con main_daemon.py
 """
 
+import os
+import re
+import select
+import selectors
 import serial
 import threading
 import time
 import logging
+from collections import namedtuple
 from typing import Optional, Callable, Dict, Any
 from pathlib import Path
 
+# Línea completa: contenido hasta uno o más terminadores \r / \n
+_LINE_RE = re.compile(rb'([^\r\n]*)[\r\n]+')
+
+# os.writev solo existe en POSIX
+_WRITEV = hasattr(os, 'writev')
+
+# Terminador de línea para mensajes de texto
+_CRLF = b'\r\n'
+
+# Mensajes de estado fijos, ya codificados y con terminador
+_MSG_CAMERA_READY = b'CAMERA_READY\r\n'
+_MSG_CAMERA_OFFLINE = b'CAMERA_OFFLINE\r\n'
+
+class ComandoUART(namedtuple("ComandoUART", "comando parametros timestamp")):
+    """Comando recibido que se entrega a los callbacks"""
+    __slots__ = ()
+    
+    @classmethod
+    def from_string(cls, linea: str, ahora: Optional[float] = None) -> "ComandoUART":
+        """Parsea 'comando[:p1[:p2...]]' en una sola pasada"""
+        if ahora is None:
+            ahora = time.time()
+        linea = linea.strip()
+        idx = linea.find(':')
+        if idx < 0:
+            return cls(linea.lower(), (), ahora)
+        return cls(linea[:idx].strip().lower(), tuple(linea[idx + 1:].split(':')), ahora)
+
 class UARTHandler:
     """
     Manejador UART simplificado que implementa la interfaz esperada por main_daemon.py
@@ -23,18 +56,29 @@ class UARTHandler:
         self.conexion: Optional[serial.Serial] = None
         self.ejecutando = False
         self.hilo_lectura: Optional[threading.Thread] = None
+        # Pipe para despertar el bucle de lectura: lo crea iniciar() y lo
+        # cierra detener() tras el join, así nunca se escribe en un fd cerrado
+        self._despertar_r: Optional[int] = None
+        self._despertar_w: Optional[int] = None
         
         # Callbacks para comandos
         self.callbacks_comandos: Dict[str, Callable] = {}
+        self._comandos_disponibles: Optional[str] = None  # cache para UNKNOWN_COMMAND
+        
+        # Observador de líneas recibidas; si devuelve True la línea queda consumida
+        self.on_line: Optional[Callable[[str], bool]] = None
         
-        # Buffer de comunicación
-        self.buffer_entrada = ""
+        # Velocidades permitidas por cambiar_baudrate (búsqueda O(1))
+        self._baudrates_validos = frozenset(self.config.obtener_velocidades_disponibles())
+        
+        # Buffer de comunicación (bytes crudos, se decodifica solo por línea)
+        self.buffer_entrada = bytearray()
         
         # Estadísticas básicas
         self.comandos_procesados = 0
         self.bytes_enviados = 0
         self.bytes_recibidos = 0
-        self.ultima_actividad = time.time()
+        self.ultima_actividad = time.monotonic()
         
         # Lock para thread safety
         self.lock = threading.Lock()
@@ -44,7 +88,8 @@ class UARTHandler:
     def registrar_comando(self, comando: str, callback: Callable):
         """Registra un callback para un comando"""
         self.callbacks_comandos[comando.lower()] = callback
-        self.logger.debug(f"Comando registrado: {comando}")
+        self._comandos_disponibles = None
+        self.logger.debug("Comando registrado: %s", comando)
     
     def iniciar(self):
         """Inicia el sistema UART"""
@@ -75,11 +120,13 @@ class UARTHandler:
             
             # Iniciar hilos
             self.ejecutando = True
-            self.hilo_lectura = threading.Thread(target=self._bucle_lectura, daemon=True)
+            self._despertar_r, self._despertar_w = os.pipe()
+            self.hilo_lectura = threading.Thread(target=self._bucle_lectura,
+                                                 args=(self._despertar_r,), daemon=True)
             self.hilo_lectura.start()
             
             # Enviar mensaje de inicio
-            self.enviar_mensaje("CAMERA_READY")
+            self._enviar_bytes(_MSG_CAMERA_READY)
             
             self.logger.info("Sistema UART iniciado correctamente")
             
@@ -94,11 +141,18 @@ class UARTHandler:
         
         self.ejecutando = False
         
+        # Despertar el bucle de lectura sin esperar al timeout del select
+        if self._despertar_w is not None:
+            try:
+                os.write(self._despertar_w, b'\0')
+            except OSError:
+                pass
+        
         # Enviar mensaje de cierre
         if self.conexion and self.conexion.is_open:
             try:
-                self.enviar_mensaje("CAMERA_OFFLINE")
-                time.sleep(0.1)
+                self._enviar_bytes(_MSG_CAMERA_OFFLINE)
+                self.conexion.flush()  # tcdrain: vuelve cuando el aviso salió de la línea
             except:
                 pass
         
@@ -106,6 +160,12 @@ class UARTHandler:
         if self.hilo_lectura and self.hilo_lectura.is_alive():
             self.hilo_lectura.join(timeout=5.0)
         
+        # Cerrar el pipe solo si el bucle ya no puede usarlo
+        if self._despertar_w is not None and not (self.hilo_lectura and self.hilo_lectura.is_alive()):
+            os.close(self._despertar_w)
+            os.close(self._despertar_r)
+            self._despertar_r = self._despertar_w = None
+        
         # Cerrar conexión
         if self.conexion:
             try:
@@ -121,94 +181,189 @@ class UARTHandler:
             if not self.conexion or not self.conexion.is_open:
                 return False
             
+            datos = mensaje.encode('utf-8')
+            if not datos.endswith((_CRLF, b'\n')):
+                datos += _CRLF
+            return self._enviar_bytes(datos)
+            
+        except Exception as e:
+            self.logger.error(f"Error enviando mensaje: {e}")
+            return False
+    
+    def _enviar_bytes(self, datos: bytes) -> bool:
+        """Envía una línea ya codificada y terminada (sin encode ni chequeo de CRLF)"""
+        try:
+            if not self.conexion or not self.conexion.is_open:
+                return False
+            
+            # Sin flush(): write() ya entrega los bytes al kernel y tcdrain
+            # bloquearía al emisor hasta que salgan físicamente por la línea
             with self.lock:
-                if not mensaje.endswith(('\r\n', '\n')):
-                    mensaje += '\r\n'
-                
-                bytes_enviados = self.conexion.write(mensaje.encode('utf-8'))
-                self.conexion.flush()
-                
+                bytes_enviados = self.conexion.write(datos)
                 self.bytes_enviados += bytes_enviados
-                self.ultima_actividad = time.time()
-                
-            self.logger.debug(f"Enviado: {mensaje.strip()}")
+                self.ultima_actividad = time.monotonic()
+            
+            # Sin formateo ni strip() si DEBUG está deshabilitado (ruta de ACKs)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Enviado: %s", datos.rstrip().decode('utf-8', errors='replace'))
             return True
             
         except Exception as e:
             self.logger.error(f"Error enviando mensaje: {e}")
             return False
     
-    def _bucle_lectura(self):
-        """Bucle principal de lectura UART"""
-        self.logger.debug("Iniciando bucle de lectura UART")
+    def _write_raw(self, *buffers) -> int:
+        """
+        Escribe buffers crudos (bytes o memoryview) sin copias intermedias.
+        
+        No actualiza estadísticas: quien llama acumula lo devuelto y lo suma
+        con _sumar_bytes_enviados() (una vez por transferencia en los chunks).
+        """
+        with self.lock:
+            return self._escribir_fd(*buffers)
+    
+    def _sumar_bytes_enviados(self, cantidad: int):
+        """Suma a las estadísticas bytes escritos con _write_raw()"""
+        with self.lock:
+            self.bytes_enviados += cantidad
+            self.ultima_actividad = time.monotonic()
+    
+    def _escribir_fd(self, *buffers) -> int:
+        """Escritura directa al descriptor del puerto (writev si existe), reintentando escrituras parciales"""
+        try:
+            fd = self.conexion.fileno()
+        except (AttributeError, OSError):
+            # Sin descriptor POSIX (Windows, loop://, socket://; fileno() lanza
+            # io.UnsupportedOperation): pyserial copia a bytes internamente
+            return sum(self.conexion.write(buf) for buf in buffers)
         
-        while self.ejecutando:
+        pendientes = [memoryview(buf) for buf in buffers if len(buf)]
+        enviado = 0
+        while pendientes:
             try:
-                if not self.conexion or not self.conexion.is_open:
-                    time.sleep(1.0)
+                # writev: header + datos en una sola llamada al sistema
+                if _WRITEV:
+                    n = os.writev(fd, pendientes)
+                else:
+                    n = os.write(fd, pendientes[0])
+            except BlockingIOError:
+                # pyserial abre el puerto con O_NONBLOCK: esperar a que acepte más datos
+                _, listos, _ = select.select([], [fd], [], self.conexion.write_timeout)
+                if not listos:
+                    raise serial.SerialTimeoutException("Write timeout")
+                continue
+            
+            # Descartar lo ya escrito (la escritura puede cortar a mitad de un buffer)
+            enviado += n
+            while pendientes and n >= len(pendientes[0]):
+                n -= len(pendientes.pop(0))
+            if n:
+                pendientes[0] = pendientes[0][n:]
+        
+        return enviado
+    
+    def _bucle_lectura(self, despertar_r: int):
+        """Bucle principal de lectura UART (`despertar_r`: extremo de lectura del pipe de despertar)"""
+        self.logger.debug("Iniciando bucle de lectura UART")
+        
+        # Referencias locales: evitan la cadena de atributos en cada iteración
+        conn = fd = None
+        sin_fd = False
+        procesar = self._procesar_datos_recibidos
+        
+        # Esperar legibilidad del descriptor (epoll en Linux) en lugar de sondear
+        with selectors.DefaultSelector() as sel:
+            # Pipe de despertar: detener() escribe un byte y select() retorna al instante
+            sel.register(despertar_r, selectors.EVENT_READ)
+            while self.ejecutando:
+                try:
+                    # cambiar_baudrate() reemplaza la conexión: re-registrar su descriptor
+                    if self.conexion is not conn:
+                        if fd is not None:
+                            sel.unregister(fd)
+                            fd = None
+                        conn = self.conexion
+                        sin_fd = False
+                    
+                    if not conn or not conn.is_open:
+                        sel.select(timeout=1.0)  # solo el pipe: detener() la corta
+                        continue
+                    
+                    if fd is None and not sin_fd:
+                        try:
+                            fd = conn.fileno()
+                        except (AttributeError, OSError):
+                            # Sin descriptor (Windows, loop://, socket://)
+                            sin_fd = True
+                        else:
+                            sel.register(fd, selectors.EVENT_READ)
+                    
+                    if sin_fd:
+                        # Sondeo con in_waiting/read(); el select solo vigila el pipe
+                        if conn.in_waiting > 0:
+                            data = conn.read(conn.in_waiting)
+                            if data:
+                                procesar(data)
+                        else:
+                            sel.select(timeout=0.05)
+                        continue
+                    
+                    # El timeout solo cubre el reemplazo de la conexión
+                    for clave, _ in sel.select(timeout=0.5):
+                        if clave.fd != fd:
+                            continue  # despertado por detener(): revisar self.ejecutando
+                        data = os.read(fd, 4096)
+                        if not data:
+                            raise serial.SerialException("Puerto listo para lectura pero sin datos")
+                        procesar(data)
+                    
+                except BlockingIOError:
                     continue
-                
-                # Leer datos disponibles
-                if self.conexion.in_waiting > 0:
-                    data = self.conexion.read(self.conexion.in_waiting)
-                    if data:
-                        self._procesar_datos_recibidos(data)
-                
-                time.sleep(0.05)
-                
-            except Exception as e:
-                self.logger.error(f"Error en bucle de lectura: {e}")
-                time.sleep(1.0)
+                except Exception as e:
+                    self.logger.error(f"Error en bucle de lectura: {e}")
+                    time.sleep(1.0)
     
     def _procesar_datos_recibidos(self, data: bytes):
         """Procesa datos recibidos"""
         try:
-            texto = data.decode('utf-8', errors='ignore')
-            self.buffer_entrada += texto
+            self.buffer_entrada.extend(data)
             self.bytes_recibidos += len(data)
-            self.ultima_actividad = time.time()
+            # Un solo timestamp para todo el lote recibido
+            ahora = time.time()
+            self.ultima_actividad = time.monotonic()
             
-            # Procesar líneas completas
-            while '\n' in self.buffer_entrada or '\r' in self.buffer_entrada:
-                if '\n' in self.buffer_entrada:
-                    linea, self.buffer_entrada = self.buffer_entrada.split('\n', 1)
-                else:
-                    linea, self.buffer_entrada = self.buffer_entrada.split('\r', 1)
-                
-                linea = linea.strip()
+            # Procesar líneas completas en una sola pasada sobre el buffer
+            fin = 0
+            for match in _LINE_RE.finditer(self.buffer_entrada):
+                fin = match.end()
+                linea = match.group(1).decode('utf-8', errors='ignore').strip()
                 if linea:
-                    self._procesar_comando(linea)
+                    self._procesar_comando(linea, ahora)
+            
+            if fin:
+                del self.buffer_entrada[:fin]
                     
         except Exception as e:
             self.logger.error(f"Error procesando datos: {e}")
     
-    def _procesar_comando(self, linea: str):
+    def _procesar_comando(self, linea: str, ahora: Optional[float] = None):
         """Procesa un comando recibido"""
         try:
-            # Parsear comando
-            if ':' in linea:
-                partes = linea.split(':', 1)
-                comando = partes[0].lower().strip()
-                parametros = [partes[1]] if len(partes) > 1 else []
-            else:
-                comando = linea.lower().strip()
-                parametros = []
-            
-            self.logger.debug(f"Comando recibido: {comando} {parametros}")
+            # Líneas consumidas por el observador (p. ej. control de transferencia)
+            if self.on_line and self.on_line(linea):
+                return
             
-            # Crear objeto comando simple
-            class ComandoUART:
-                def __init__(self, cmd, params):
-                    self.comando = cmd
-                    self.parametros = params
-                    self.timestamp = time.time()
+            cmd_obj = ComandoUART.from_string(linea, ahora)
+            comando = cmd_obj.comando
             
-            cmd_obj = ComandoUART(comando, parametros)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Comando recibido: %s %s", comando, cmd_obj.parametros)
             
             # Buscar callback
-            if comando in self.callbacks_comandos:
+            callback = self.callbacks_comandos.get(comando)
+            if callback is not None:
                 try:
-                    respuesta = self.callbacks_comandos[comando](cmd_obj)
+                    respuesta = callback(cmd_obj)
                     if respuesta:
                         self.enviar_mensaje(respuesta)
                     
@@ -220,8 +375,9 @@ class UARTHandler:
                     self.logger.error(f"Error en callback '{comando}': {e}")
             else:
                 # Comando no reconocido
-                comandos_disponibles = list(self.callbacks_comandos.keys())
-                error_msg = f"ERROR|UNKNOWN_COMMAND|Comando '{comando}' no reconocido. Disponibles: {', '.join(comandos_disponibles)}"
+                if self._comandos_disponibles is None:
+                    self._comandos_disponibles = ', '.join(self.callbacks_comandos)
+                error_msg = f"ERROR|UNKNOWN_COMMAND|Comando '{comando}' no reconocido. Disponibles: {self._comandos_disponibles}"
                 self.enviar_mensaje(error_msg)
                 self.logger.warning(f"Comando no reconocido: {comando}")
                 
@@ -231,10 +387,8 @@ class UARTHandler:
     def cambiar_baudrate(self, nuevo_baudrate: int) -> bool:
         """Cambia la velocidad UART"""
         try:
-            velocidades_validas = [9600, 19200, 38400, 57600, 115200, 230400]
-            
-            if nuevo_baudrate not in velocidades_validas:
-                self.logger.error(f"Velocidad {nuevo_baudrate} no válida")
+            if nuevo_baudrate not in self._baudrates_validos:
+                self.logger.error(f"Velocidad {nuevo_baudrate} no válida. Válidas: {sorted(self._baudrates_validos)}")
                 return False
             
             self.logger.info(f"Cambiando velocidad de {self.config.uart.baudrate} a {nuevo_baudrate}")
@@ -248,6 +402,7 @@ class UARTHandler:
             
             # Reconectar con nueva velocidad
             if self.conexion:
+                self.conexion.flush()  # que el aviso salga a la velocidad anterior
                 self.conexion.close()
             
             time.sleep(2.0)
@@ -6,69 +6,229 @@ Actualizado para compatibilidad con rpicam-apps y libcamera-apps
 
 import sys
 import os
-import subprocess
-import time
+import argparse
+import asyncio
+import contextvars
+import importlib.util
+import io
+import functools
+import glob
+import platform
+import signal
+import threading
+import traceback
+from subprocess import PIPE, DEVNULL
 
 # Agregar src al path
 sys.path.insert(0, os.path.join(os.getcwd(), 'src'))
 
+# CAMERA_TEST_VERBOSE=1 muestra el traceback completo de los errores
+VERBOSE = bool(os.environ.get('CAMERA_TEST_VERBOSE'))
+
+# Las fases del reporte corren como tareas asyncio o en hilos: cada fase
+# acumula su salida en un buffer propio (variable de contexto, aislada por
+# tarea y por hilo) y la escribe entera, con un solo write, al terminar
+_salida_lock = threading.Lock()
+_salida_buf = contextvars.ContextVar('salida_buf', default=None)
+
+# Prefijos ya codificados: el emoji no se vuelve a codificar en cada línea
+_PFX_HEADER = f"\n{'='*60}\n🧪 ".encode('utf-8')
+_SUF_HEADER = f"\n{'='*60}".encode('utf-8')
+_PFX_OK = "✅ ".encode('utf-8')
+_PFX_WARN = "⚠️  ".encode('utf-8')
+_PFX_ERROR = "❌ ".encode('utf-8')
+_PFX_INFO = "ℹ️  ".encode('utf-8')
+
+def _escribir_stdout(datos):
+    """Escribe bytes UTF-8 en stdout de una vez"""
+    salida = getattr(sys.stdout, 'buffer', None)
+    if salida is None:
+        # stdout reemplazado por un stream solo de texto
+        sys.stdout.write(datos.decode('utf-8'))
+        sys.stdout.flush()
+        return
+    sys.stdout.flush()  # lo pendiente en la capa de texto sale antes
+    salida.write(datos)
+    salida.flush()
+
+def _emitir(texto, prefijo=b'', sufijo=b''):
+    """Imprime una línea (al buffer de la sección activa, si hay)"""
+    linea = prefijo + texto.encode('utf-8') + sufijo + b'\n'
+    buf = _salida_buf.get()
+    if buf is not None:
+        buf.write(linea)
+        return
+    with _salida_lock:
+        _escribir_stdout(linea)
+
+class _Seccion:
+    """
+    Acumula lo impreso por la tarea o hilo actual y lo vuelca al salir.
+    
+    Con `volcar=False` la salida queda en `buf` para que quien llama decida
+    cuándo escribirla.
+    """
+    
+    def __init__(self, volcar=True):
+        self.volcar = volcar
+    
+    def __enter__(self):
+        self._anterior = _salida_buf.get()
+        self.buf = io.BytesIO()
+        self._token = _salida_buf.set(self.buf)
+        return self
+    
+    def __exit__(self, *exc):
+        _salida_buf.reset(self._token)
+        datos = self.buf.getvalue()
+        if self._anterior is not None:
+            self._anterior.write(datos)
+        elif datos and self.volcar:
+            with _salida_lock:
+                _escribir_stdout(datos)
+        return False
+
+def _en_seccion(func):
+    """Decora una fase (función o corrutina) para que toda su salida salga junta"""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def envoltura_async(*args, **kwargs):
+            with _Seccion():
+                return await func(*args, **kwargs)
+        return envoltura_async
+    
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        with _Seccion():
+            return func(*args, **kwargs)
+    return envoltura
+
+def _capturar(func, *args):
+    """Ejecuta func(*args) reteniendo su salida; devuelve (resultado, salida)"""
+    with _Seccion(volcar=False) as seccion:
+        resultado = func(*args)
+    return resultado, seccion.buf.getvalue()
+
+async def _capturar_async(corrutina):
+    """Como _capturar, para una corrutina"""
+    with _Seccion(volcar=False) as seccion:
+        resultado = await corrutina
+    return resultado, seccion.buf.getvalue()
+
 def print_header(title):
     """Imprime encabezado de sección"""
-    print(f"\n{'='*60}")
-    print(f"🧪 {title}")
-    print('='*60)
+    _emitir(title, _PFX_HEADER, _SUF_HEADER)
 
 def print_success(msg):
     """Imprime mensaje de éxito"""
-    print(f"✅ {msg}")
+    _emitir(msg, _PFX_OK)
 
 def print_warning(msg):
     """Imprime mensaje de advertencia"""
-    print(f"⚠️  {msg}")
+    _emitir(msg, _PFX_WARN)
 
 def print_error(msg):
     """Imprime mensaje de error"""
-    print(f"❌ {msg}")
+    _emitir(msg, _PFX_ERROR)
 
 def print_info(msg):
     """Imprime mensaje informativo"""
-    print(f"ℹ️  {msg}")
+    _emitir(msg, _PFX_INFO)
+
+# Resultados de sondas compartidos entre fases: PATH se recorre una sola vez
+# y cada binario se ejecuta con --help como mucho una vez por corrida
+_EN_PATH = None
+_CMD_RUNS = {}
+
+def _ejecutables_en_path():
+    """Nombres de archivo de todos los directorios de PATH (un scandir por directorio)"""
+    global _EN_PATH
+    if _EN_PATH is None:
+        presentes = set()
+        for directorio in os.environ.get('PATH', '').split(os.pathsep):
+            try:
+                with os.scandir(directorio or '.') as entradas:
+                    presentes.update(e.name for e in entradas if e.is_file())
+            except OSError:
+                pass
+        _EN_PATH = presentes
+    return _EN_PATH
+
+def _cmd_available(cmd):
+    """True si `cmd` está en PATH"""
+    return cmd in _ejecutables_en_path()
+
+async def _probar_comando(cmd):
+    """Ejecuta `cmd --help` y devuelve (estado, detalle) sin lanzar excepciones"""
+    if not _cmd_available(cmd):
+        return 'no_encontrado', None
+    if cmd in _CMD_RUNS:
+        return _CMD_RUNS[cmd]
+    
+    proc = None
+    try:
+        # La ayuda ocupa varios KB: descartarla y confiar en el código de salida
+        proc = await asyncio.create_subprocess_exec(cmd, '--help',
+                                                    stdout=DEVNULL,
+                                                    stderr=DEVNULL)
+        returncode = await asyncio.wait_for(proc.wait(), 5)
+        if returncode == 0:
+            resultado = 'ok', None
+        else:
+            resultado = 'no', None
+    except FileNotFoundError:
+        resultado = 'no_encontrado', None
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        resultado = 'timeout', None
+    except Exception as e:
+        resultado = 'error', e
+    
+    _CMD_RUNS[cmd] = resultado
+    return resultado
+
+# Comandos a verificar
+COMANDOS_CAMARA = (
+    ("rpicam-still", "Raspberry Pi OS Bookworm+"),
+    ("rpicam-vid", "Video Bookworm+"),
+    ("rpicam-hello", "Test Bookworm+"),
+    ("rpicam-jpeg", "JPEG Bookworm+"),
+    ("libcamera-still", "Versiones anteriores"),
+    ("libcamera-vid", "Video anteriores"),
+    ("libcamera-hello", "Test anteriores"),
+    ("libcamera-jpeg", "JPEG anteriores")
+)
 
 def test_camera_commands():
     """Prueba la disponibilidad de comandos de cámara"""
+    return asyncio.run(_verificar_comandos())
+
+@_en_seccion
+async def _verificar_comandos():
+    """Cuerpo de test_camera_commands"""
     print_header("VERIFICACIÓN DE COMANDOS DE CÁMARA")
     
-    # Comandos a verificar
-    commands_to_test = [
-        ("rpicam-still", "Raspberry Pi OS Bookworm+"),
-        ("rpicam-vid", "Video Bookworm+"),
-        ("rpicam-hello", "Test Bookworm+"),
-        ("rpicam-jpeg", "JPEG Bookworm+"),
-        ("libcamera-still", "Versiones anteriores"),
-        ("libcamera-vid", "Video anteriores"),
-        ("libcamera-hello", "Test anteriores"),
-        ("libcamera-jpeg", "JPEG anteriores")
-    ]
+    commands_to_test = COMANDOS_CAMARA
     
     available_commands = []
     
-    for cmd, description in commands_to_test:
-        try:
-            # Verificar si el comando existe
-            result = subprocess.run([cmd, '--help'], 
-                                  capture_output=True, 
-                                  timeout=5)
-            if result.returncode == 0 or 'usage' in result.stderr.decode().lower():
-                print_success(f"{cmd} - {description}")
-                available_commands.append(cmd)
-            else:
-                print_warning(f"{cmd} - No disponible")
-        except FileNotFoundError:
+    # Las sondas son independientes: lanzarlas todas a la vez y esperar una sola
+    # vez. gather() conserva el orden de la lista para imprimir los resultados.
+    resultados = await asyncio.gather(*(_probar_comando(cmd) for cmd, _ in commands_to_test))
+    
+    for (cmd, description), (estado, detalle) in zip(commands_to_test, resultados):
+        if estado == 'ok':
+            print_success(f"{cmd} - {description}")
+            available_commands.append(cmd)
+        elif estado == 'no':
+            print_warning(f"{cmd} - No disponible")
+        elif estado == 'no_encontrado':
             print_warning(f"{cmd} - No encontrado")
-        except subprocess.TimeoutExpired:
+        elif estado == 'timeout':
             print_error(f"{cmd} - Timeout")
-        except Exception as e:
-            print_error(f"{cmd} - Error: {e}")
+        else:
+            print_error(f"{cmd} - Error: {detalle}")
     
     if available_commands:
         print_info(f"Comandos disponibles: {', '.join(available_commands)}")
@@ -77,65 +237,144 @@ def test_camera_commands():
         print_warning("No se encontraron comandos de cámara del sistema")
         return []
 
-def test_camera_hardware():
-    """Prueba el hardware de la cámara"""
+def _hay_nodo_video():
+    """True si el kernel expone algún dispositivo de video (solo stat/readdir)"""
+    if os.path.exists('/dev/video0'):
+        return True
+    try:
+        with os.scandir('/sys/class/video4linux') as entradas:
+            return any(True for _ in entradas)
+    except OSError:
+        return False
+
+# Nombres (sysfs) de los receptores CSI: solo aparecen con un sensor detectado.
+# Los nodos del ISP (bcm2835-isp, pispbe) existen siempre y no prueban nada.
+NODOS_SENSOR = ('unicam', 'rp1-cfe')
+
+def _sensor_en_sysfs():
+    """Nombre del receptor de cámara en /sys/class/video4linux, o None"""
+    for ruta in glob.glob('/sys/class/video4linux/video*/name'):
+        try:
+            with open(ruta) as f:
+                nombre = f.read().strip()
+        except OSError:
+            continue
+        if nombre.startswith(NODOS_SENSOR):
+            return nombre
+    return None
+
+# Variantes del comando hello, en orden de preferencia, con los argumentos
+# para una prueba de 100 ms (rpicam-hello: -t; libcamera-hello: --timeout)
+HELLO_ARGS = {
+    'rpicam-hello': ('-t', '100'),
+    'libcamera-hello': ('--timeout', '100'),
+}
+TIMEOUT_HELLO = 3  # segundos
+
+async def _lanzar_sonda(args, stdout=DEVNULL):
+    """Arranca `args` en una sesión propia y vuelve sin esperar"""
+    return await asyncio.create_subprocess_exec(*args, stdout=stdout, stderr=PIPE,
+                                                start_new_session=True)
+
+async def _esperar_sonda(proc, timeout):
+    """
+    Recoge el resultado de _lanzar_sonda() como (código, stdout, stderr), con
+    la salida decodificada. Si vence el timeout se mata el grupo de procesos
+    completo (libcamera puede dejar hijos colgados).
+    """
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        os.killpg(proc.pid, signal.SIGKILL)
+        await proc.wait()
+        raise
+    if stdout is not None:
+        stdout = stdout.decode('utf-8', 'replace')
+    return proc.returncode, stdout, stderr.decode('utf-8', 'replace')
+
+def test_camera_hardware(funcional=False):
+    """
+    Prueba el hardware de la cámara.
+    
+    La prueba funcional (arrancar rpicam-hello/libcamera-hello) solo se hace
+    si hay un dispositivo de video, sysfs no muestra el receptor y se pide
+    con `funcional` (--funcional en línea de comandos).
+    """
+    return asyncio.run(_verificar_hardware(funcional))
+
+@_en_seccion
+async def _verificar_hardware(funcional=False):
+    """Cuerpo de test_camera_hardware"""
     print_header("VERIFICACIÓN DE HARDWARE DE CÁMARA")
     
     # Test 1: vcgencmd
-    try:
-        result = subprocess.run(['vcgencmd', 'get_camera'], 
-                              capture_output=True, text=True, timeout=5)
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            print_info(f"vcgencmd get_camera: {output}")
-            
-            if 'supported=1' in output and 'detected=1' in output:
-                print_success("Cámara detectada por vcgencmd")
-                return True
+    if not _cmd_available('vcgencmd'):
+        print_warning("vcgencmd no disponible")
+    else:
+        try:
+            proc = await _lanzar_sonda(['vcgencmd', 'get_camera'], stdout=PIPE)
+            returncode, stdout, _ = await _esperar_sonda(proc, 5)
+            if returncode == 0:
+                output = stdout.strip()
+                print_info(f"vcgencmd get_camera: {output}")
+                
+                if 'supported=1' in output and 'detected=1' in output:
+                    print_success("Cámara detectada por vcgencmd")
+                    return True
+                else:
+                    print_warning("Cámara no detectada por vcgencmd")
             else:
-                print_warning("Cámara no detectada por vcgencmd")
-        else:
-            print_warning("vcgencmd no disponible")
-    except Exception as e:
-        print_warning(f"Error con vcgencmd: {e}")
+                print_warning("vcgencmd no disponible")
+        except asyncio.TimeoutError:
+            print_warning("vcgencmd timeout")
+        except Exception as e:
+            print_warning(f"Error con vcgencmd: {e}")
     
-    # Test 2: Comando hello disponible
-    hello_commands = ['rpicam-hello', 'libcamera-hello']
+    # Test 2: Dispositivo de video presente (barato, antes de iniciar libcamera)
+    if not _hay_nodo_video():
+        print_warning("Sin dispositivos de video (/dev/video*, /sys/class/video4linux)")
+        return False
+    print_info("Dispositivo de video presente")
     
-    for cmd in hello_commands:
+    # Test 3: Receptor de cámara en sysfs (sin arrancar libcamera)
+    sensor = _sensor_en_sysfs()
+    if sensor:
+        print_success(f"Receptor de cámara presente: {sensor}")
+        return True
+    
+    if not funcional:
+        print_info("Prueba funcional omitida (usar --funcional para activarla)")
+        return True
+    
+    # Test 4: sysfs no concluyente, probar con el comando hello
+    for cmd, extra in HELLO_ARGS.items():
+        if not _cmd_available(cmd):
+            print_info(f"{cmd} no disponible")
+            continue
+        
         try:
             print_info(f"Probando {cmd}...")
             
-            # Usar sintaxis correcta según el comando
-            if cmd == 'rpicam-hello':
-                # Sintaxis rpicam-hello: -t en milisegundos
-                result = subprocess.run([
-                    cmd, 
-                    '-t', '100'  # 100ms timeout
-                ], capture_output=True, timeout=10)
-            else:
-                # Sintaxis libcamera-hello: --timeout en milisegundos
-                result = subprocess.run([
-                    cmd, 
-                    '--timeout', '100'  # 100ms timeout
-                ], capture_output=True, timeout=10)
+            proc = await _lanzar_sonda([cmd, *extra])
+            returncode, _, stderr = await _esperar_sonda(proc, TIMEOUT_HELLO)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 print_success(f"Cámara responde correctamente a {cmd}")
                 return True
             else:
-                error_output = result.stderr.decode() if result.stderr else "Sin error específico"
+                error_output = stderr or "Sin error específico"
                 print_warning(f"{cmd} falló: {error_output}")
                 
         except FileNotFoundError:
             print_info(f"{cmd} no disponible")
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             print_warning(f"{cmd} timeout - posible problema de cámara")
         except Exception as e:
             print_error(f"Error con {cmd}: {e}")
     
     return False
 
+@_en_seccion
 def test_picamera2():
     """Prueba la disponibilidad de picamera2"""
     print_header("VERIFICACIÓN DE PICAMERA2")
@@ -162,8 +401,14 @@ def test_picamera2():
         print_warning(f"picamera2 no disponible: {e}")
         return False
 
-def test_controller():
-    """Prueba el controlador de cámara actualizado"""
+@_en_seccion
+def test_controller(do_capture=False):
+    """
+    Prueba el controlador de cámara actualizado.
+    
+    La captura real (calentamiento del sensor, hasta varios segundos) solo se
+    hace con `do_capture`; para validar compatibilidad no hace falta.
+    """
     print_header("PRUEBA DEL CONTROLADOR DE CÁMARA")
     
     try:
@@ -185,7 +430,7 @@ def test_controller():
         print_info("Comandos disponibles:")
         for cmd, disponible in info_sistema['comandos_disponibles'].items():
             status = "✅" if disponible else "❌"
-            print(f"   {status} {cmd}")
+            _emitir(f"   {status} {cmd}")
         
         # Verificar cámara
         print_info("Verificando disponibilidad de cámara...")
@@ -212,13 +457,15 @@ def test_controller():
         else:
             print_warning("Error en cambio de resolución")
         
-        # Listar fotos existentes
-        print_info("Listando fotos existentes...")
-        fotos = controller.listar_archivos()
-        print_info(f"Fotos encontradas: {len(fotos)}")
+        # Contar fotos existentes (sin listar ni hacer stat de cada una)
+        print_info("Contando fotos existentes...")
+        total_fotos = controller.contar_archivos()
+        print_info(f"Fotos encontradas: {total_fotos}")
         
-        # Test de captura (solo si la cámara está disponible)
-        if disponible:
+        # Test de captura (solo si se pidió y la cámara está disponible)
+        if not do_capture:
+            print_info("Test de captura omitido (usar --capture para activarlo)")
+        elif disponible:
             print_info("Realizando test de captura...")
             resultado_test = controller.realizar_captura_test()
             
@@ -251,11 +498,12 @@ def test_controller():
         return True
         
     except Exception as e:
-        print_error(f"Error en pruebas del controlador: {e}")
-        import traceback
-        traceback.print_exc()
+        print_error(f"Error en pruebas del controlador: {type(e).__name__}: {e}")
+        if VERBOSE:
+            traceback.print_exc()
         return False
 
+@_en_seccion
 def test_compatibility_aliases():
     """Prueba los alias de compatibilidad"""
     print_header("VERIFICACIÓN DE ALIAS DE COMPATIBILIDAD")
@@ -270,10 +518,9 @@ def test_compatibility_aliases():
     compatibility_ok = True
     
     for new_cmd, old_cmd in alias_pairs:
-        new_available = subprocess.run(['which', new_cmd], 
-                                     capture_output=True).returncode == 0
-        old_available = subprocess.run(['which', old_cmd], 
-                                     capture_output=True).returncode == 0
+        # Pertenencia al conjunto de PATH, sin subprocesos
+        new_available = _cmd_available(new_cmd)
+        old_available = _cmd_available(old_cmd)
         
         if new_available and old_available:
             print_success(f"Ambos disponibles: {new_cmd} y {old_cmd}")
@@ -294,76 +541,236 @@ def test_compatibility_aliases():
     
     return compatibility_ok
 
-def generate_compatibility_report():
-    """Genera un reporte completo de compatibilidad"""
-    print_header("REPORTE DE COMPATIBILIDAD COMPLETO")
+# Versión del OS por VERSION_CODENAME: (descripción, comandos esperados)
+VERSIONES_OS = {
+    'bookworm': ("Raspberry Pi OS Bookworm (2023+)", ["rpicam-still", "rpicam-vid", "rpicam-hello"]),
+    'bullseye': ("Raspberry Pi OS Bullseye (2021-2023)", ["libcamera-still", "libcamera-vid", "libcamera-hello"]),
+    'buster': ("Raspberry Pi OS Buster (2019-2021)", ["picamera2 only"]),
+}
+_OS_RELEASE = None
+
+def _os_release():
+    """Campos de /etc/os-release, leídos una sola vez por corrida"""
+    global _OS_RELEASE
+    if _OS_RELEASE is None:
+        if hasattr(platform, 'freedesktop_os_release'):  # Python 3.10+
+            _OS_RELEASE = platform.freedesktop_os_release()
+        else:
+            campos = {}
+            with open('/etc/os-release', 'r') as f:
+                for linea in f:
+                    clave, sep, valor = linea.rstrip('\n').partition('=')
+                    if sep:
+                        campos[clave] = valor.strip('"\'')
+            _OS_RELEASE = campos
+    return _OS_RELEASE
+
+async def _ejecutar_fases(skip_picamera2, skip_controller, do_capture, funcional):
+    """
+    Corre las fases del reporte en un solo bucle de eventos y devuelve los
+    pares (nombre, resultado) en orden fijo, sin las fases omitidas.
     
-    # Información del sistema
-    try:
-        with open('/etc/os-release', 'r') as f:
-            os_info = f.read()
+    Solo se solapan las fases que no tocan la cámara: las sondas --help de
+    los comandos (subprocesos asíncronos) y los alias (en el executor del
+    bucle). Hello (hardware), Picamera2() y el controlador abren la cámara,
+    que admite un solo proceso a la vez, y corren una tras otra.
+    
+    Cada fase retiene su salida y se imprime en el orden del resumen, en
+    cuanto terminan ella y las anteriores.
+    """
+    loop = asyncio.get_running_loop()
+    
+    async def tras(previa, func, *args):
+        """Corre func en el executor cuando termina la fase de cámara `previa`"""
+        await previa
+        return await loop.run_in_executor(None, _capturar, func, *args)
+    
+    t_comandos = asyncio.ensure_future(_capturar_async(_verificar_comandos()))
+    f_alias = loop.run_in_executor(None, _capturar, test_compatibility_aliases)
+    t_hardware = asyncio.ensure_future(_capturar_async(_verificar_hardware(funcional)))
+    t_picamera2 = None
+    if not skip_picamera2:
+        t_picamera2 = asyncio.ensure_future(tras(t_hardware, test_picamera2))
+    t_controlador = None
+    if not skip_controller:
+        t_controlador = asyncio.ensure_future(
+            tras(t_picamera2 or t_hardware, test_controller, do_capture))
+    
+    # Pares (nombre, fase) en orden fijo; None marca una fase omitida
+    fases = (
+        ('comandos_sistema', t_comandos),
+        ('hardware_camara', t_hardware),
+        ('picamera2', t_picamera2),
+        ('controlador', t_controlador),
+        ('compatibilidad', f_alias),
+    )
+    
+    results = []
+    for nombre, fase in fases:
+        if fase is None:
+            continue
+        resultado, salida = await fase
+        if salida:
+            with _salida_lock:
+                _escribir_stdout(salida)
+        # comandos_sistema devuelve la lista de comandos disponibles
+        results.append((nombre, bool(resultado)))
+    return tuple(results)
+
+def generate_compatibility_report(skip_picamera2=False, skip_controller=False,
+                                  do_capture=False, funcional=False):
+    """
+    Genera un reporte completo de compatibilidad.
+    
+    Las fases omitidas no cuentan en el resumen; con `skip_picamera2` solo se
+    comprueba si el paquete está instalado, sin importarlo (carga libcamera).
+    `skip_picamera2` implica `skip_controller`: camara_controller importa
+    picamera2 al cargarse. `do_capture` activa la captura real en la prueba
+    del controlador y `funcional` el arranque de hello en la de hardware.
+    """
+    omitir_controlador_por_import = skip_picamera2 and not skip_controller
+    skip_controller = skip_controller or skip_picamera2
+    
+    with _Seccion():
+        print_header("REPORTE DE COMPATIBILIDAD COMPLETO")
+        
+        # Información del sistema
+        try:
+            codename = _os_release().get('VERSION_CODENAME', '').lower()
+            os_version, expected_commands = VERSIONES_OS.get(codename, ("Versión desconocida", []))
+            
+            print_info(f"Sistema operativo: {os_version}")
+            print_info(f"Comandos esperados: {', '.join(expected_commands)}")
+        
+        except Exception as e:
+            print_warning(f"No se pudo determinar la versión del OS: {e}")
+    
+    results = asyncio.run(_ejecutar_fases(skip_picamera2, skip_controller, do_capture, funcional))
+    
+    if skip_picamera2:
+        instalado = importlib.util.find_spec('picamera2') is not None
+        print_info(f"picamera2 omitido (instalado: {'sí' if instalado else 'no'})")
+    if omitir_controlador_por_import:
+        print_info("Prueba del controlador omitida (camara_controller importa picamera2)")
+    elif skip_controller:
+        print_info("Prueba del controlador omitida")
+    
+    with _Seccion():
+        print_header("RESUMEN DE RESULTADOS")
+        
+        total_tests = len(results)
+        passed_tests = sum(r for _, r in results)
+        
+        for test_name, result in results:
+            status = "✅ PASS" if result else "❌ FAIL"
+            _emitir(f"{status} {test_name.replace('_', ' ').title()}")
         
-        if 'bookworm' in os_info.lower():
-            os_version = "Raspberry Pi OS Bookworm (2023+)"
-            expected_commands = ["rpicam-still", "rpicam-vid", "rpicam-hello"]
-        elif 'bullseye' in os_info.lower():
-            os_version = "Raspberry Pi OS Bullseye (2021-2023)"
-            expected_commands = ["libcamera-still", "libcamera-vid", "libcamera-hello"]
-        elif 'buster' in os_info.lower():
-            os_version = "Raspberry Pi OS Buster (2019-2021)"
-            expected_commands = ["picamera2 only"]
+        _emitir(f"\nResultado final: {passed_tests}/{total_tests} tests pasaron")
+        
+        if passed_tests == total_tests:
+            print_success("🎉 Todas las pruebas completadas exitosamente")
+            print_info("El sistema es totalmente compatible y funcional")
+        elif passed_tests >= total_tests - 1:
+            print_warning("⚠️  Sistema mayormente funcional con limitaciones menores")
         else:
-            os_version = "Versión desconocida"
-            expected_commands = []
+            print_error("❌ Sistema con problemas significativos")
+            print_info("Revisar los errores anteriores y:")
+            print_info("  • Verificar conexión física de la cámara")
+            print_info("  • Ejecutar raspi-config para habilitar cámara")
+            print_info("  • Instalar paquetes faltantes")
+            print_info("  • Reiniciar el sistema")
+    
+    return passed_tests >= total_tests - 1
+
+def quick_report():
+    """
+    Reporte rápido: solo búsqueda en PATH y sysfs, sin ejecutar nada.
+    
+    No importa picamera2 ni instancia el controlador; pensado para pruebas
+    de humo (CI) que deben terminar en milisegundos.
+    """
+    with _Seccion():
+        print_header("REPORTE RÁPIDO")
         
-        print_info(f"Sistema operativo: {os_version}")
-        print_info(f"Comandos esperados: {', '.join(expected_commands)}")
+        hay_comando = False
+        for cmd, _ in COMANDOS_CAMARA:
+            ok = _cmd_available(cmd)
+            hay_comando = hay_comando or ok
+            _emitir(f"{'✅ PASS' if ok else '❌ FAIL'} {cmd}")
         
-    except Exception as e:
-        print_warning(f"No se pudo determinar la versión del OS: {e}")
+        sensor = _sensor_en_sysfs()
+        nodo = sensor is not None or _hay_nodo_video()
+        _emitir(f"{'✅ PASS' if sensor else '❌ FAIL'} Receptor de cámara"
+                f"{f' ({sensor})' if sensor else ''}")
+        _emitir(f"{'✅ PASS' if nodo else '❌ FAIL'} Dispositivo de video")
     
-    # Resumen de tests
-    results = {
-        'comandos_sistema': len(test_camera_commands()) > 0,
-        'hardware_camara': test_camera_hardware(),
-        'picamera2': test_picamera2(),
-        'controlador': test_controller(),
-        'compatibilidad': test_compatibility_aliases()
-    }
+    return hay_comando and nodo
+
+def configurar_argumentos():
+    """Configura argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Test de compatibilidad del sistema de cámara UART"
+    )
     
-    print_header("RESUMEN DE RESULTADOS")
+    parser.add_argument(
+        '--skip-picamera2',
+        action='store_true',
+        help='No importar picamera2 (solo comprobar si está instalado); '
+             'implica --skip-controller (camara_controller importa picamera2)'
+    )
     
-    total_tests = len(results)
-    passed_tests = sum(results.values())
+    parser.add_argument(
+        '--skip-controller',
+        action='store_true',
+        help='No instanciar ni probar CamaraController'
+    )
     
-    for test_name, result in results.items():
-        status = "✅ PASS" if result else "❌ FAIL"
-        print(f"{status} {test_name.replace('_', ' ').title()}")
+    parser.add_argument(
+        '--capture',
+        action='store_true',
+        help='Incluir una captura real en la prueba del controlador'
+    )
     
-    print(f"\nResultado final: {passed_tests}/{total_tests} tests pasaron")
+    parser.add_argument(
+        '--funcional',
+        action='store_true',
+        help='Arrancar rpicam-hello/libcamera-hello si sysfs no muestra la cámara'
+    )
     
-    if passed_tests == total_tests:
-        print_success("🎉 Todas las pruebas completadas exitosamente")
-        print_info("El sistema es totalmente compatible y funcional")
-    elif passed_tests >= total_tests - 1:
-        print_warning("⚠️  Sistema mayormente funcional con limitaciones menores")
-    else:
-        print_error("❌ Sistema con problemas significativos")
-        print_info("Revisar los errores anteriores y:")
-        print_info("  • Verificar conexión física de la cámara")
-        print_info("  • Ejecutar raspi-config para habilitar cámara")
-        print_info("  • Instalar paquetes faltantes")
-        print_info("  • Reiniciar el sistema")
+    parser.add_argument(
+        '--quick',
+        action='store_true',
+        help='Prueba rápida: solo PATH y sysfs, sin ejecutar comandos'
+    )
     
-    return passed_tests >= total_tests - 1
+    return parser.parse_args()
 
 def main():
-    """Función principal del test"""
+    """
+    Función principal del test.
+    
+    Dos modos:
+      • completo (por defecto): generate_compatibility_report, que ejecuta
+        las sondas de comandos y libcamera, picamera2 y el controlador
+        (la captura real solo con --capture y el arranque de hello solo
+        con --funcional).
+      • --quick: quick_report, solo PATH y sysfs; no lanza procesos.
+    """
+    args = configurar_argumentos()
+    
+    if args.quick:
+        return 0 if quick_report() else 1
+    
     print("🚀 Sistema de Cámara UART - Test de Compatibilidad")
     print("Compatible con rpicam-apps (Bookworm+) y libcamera-apps (anteriores)")
     
     try:
-        success = generate_compatibility_report()
+        success = generate_compatibility_report(
+            skip_picamera2=args.skip_picamera2,
+            skip_controller=args.skip_controller,
+            do_capture=args.capture,
+            funcional=args.funcional
+        )
         
         if success:
             print_success("\n🎯 Sistema listo para usar")
@@ -380,9 +787,9 @@ def main():
         print_warning("\n🛑 Test interrumpido por usuario")
         return 1
     except Exception as e:
-        print_error(f"\n💥 Error inesperado: {e}")
-        import traceback
-        traceback.print_exc()
+        print_error(f"\n💥 Error inesperado: {type(e).__name__}: {e}")
+        if VERBOSE:
+            traceback.print_exc()
         return 1
 
 if __name__ == "__main__":
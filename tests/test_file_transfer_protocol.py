@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Pruebas de FileTransferProtocol en loopback contra un receptor simulado.
+
+El receptor reproduce la lógica de scripts/cliente_transfer_robust.py
+(READY|N, ACK|N acumulativo, NACK|N, CRC32 por chunk y trailer CHECKSUM)
+y responde en el acto por procesar_mensaje_control, como haría el hilo de
+lectura del UARTHandler.
+"""
+
+import hashlib
+import logging
+import sys
+import types
+import zlib
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import file_transfer_protocol
+from config_manager import ConfigManager
+from file_transfer_protocol import FileTransferProtocol
+
+class ReceptorSimulado:
+    """Hace de uart_handler: recibe lo que escribe el emisor y contesta"""
+
+    def __init__(self, ventana=8, chunk_size=256, corromper=()):
+        self.ventana = ventana
+        self.corromper = set(corromper)  # chunks cuyo primer envío llega dañado
+        self.config = types.SimpleNamespace(
+            transferencia=types.SimpleNamespace(chunk_size=chunk_size, verificar_checksum=True))
+        self.protocolo = None
+        self.mensajes = []
+        self.envios = {}  # chunk -> veces recibido
+        self.datos = bytearray()
+        self.esperado = 0
+        self.nack_pendiente = False
+        self.bytes_sumados = 0
+
+    def _responder(self, mensaje):
+        self.protocolo.procesar_mensaje_control(mensaje)
+
+    def enviar_mensaje(self, mensaje):
+        self.mensajes.append(mensaje)
+        if mensaje.startswith("TRANSFER_START|"):
+            self._responder(f"READY|{self.ventana}" if self.ventana > 1 else "READY")
+        elif mensaje.startswith("CHECKSUM|"):
+            ok = mensaje.partition("|")[2] == hashlib.sha256(self.datos).hexdigest()
+            self._responder("DONE" if ok else "ERROR|CHECKSUM")
+        return True
+
+    def _write_raw(self, header, chunk):
+        _, num, largo, crc = header.decode().strip().split("|")
+        num, datos = int(num), bytes(chunk)
+        assert int(largo) == len(datos)
+        self.envios[num] = self.envios.get(num, 0) + 1
+        if num in self.corromper and self.envios[num] == 1:
+            datos = bytes([datos[0] ^ 0xFF]) + datos[1:]
+
+        if self.ventana > 1:
+            self._recibir_ventana(num, datos, int(crc, 16))
+        else:
+            self._recibir_secuencial(num, datos, int(crc, 16))
+        return len(header) + len(chunk)
+
+    def _recibir_ventana(self, num, datos, crc):
+        if num < self.esperado:
+            self._responder(f"ACK|{self.esperado - 1}")
+        elif num > self.esperado:
+            if not self.nack_pendiente:
+                self._responder(f"NACK|{self.esperado}")
+                self.nack_pendiente = True
+        elif zlib.crc32(datos) != crc:
+            self._responder(f"NACK|{self.esperado}")
+            self.nack_pendiente = True
+        else:
+            self._aceptar(datos)
+            self._responder(f"ACK|{num}")
+            self.nack_pendiente = False
+
+    def _recibir_secuencial(self, num, datos, crc):
+        assert num == self.esperado
+        self._responder("CHUNK_READY")
+        if zlib.crc32(datos) != crc:
+            self._responder("NACK")
+            return
+        self._aceptar(datos)
+        self._responder("ACK")
+
+    def _aceptar(self, datos):
+        self.datos += datos
+        self.esperado += 1
+
+    def _sumar_bytes_enviados(self, cantidad):
+        self.bytes_sumados += cantidad
+
+def _transferir(tmp_path, contenido, **kwargs):
+    """Envía `contenido` al receptor simulado; devuelve (resultado, receptor)"""
+    archivo = tmp_path / "foto.jpg"
+    archivo.write_bytes(contenido)
+    receptor = ReceptorSimulado(**kwargs)
+    receptor.protocolo = FileTransferProtocol(receptor, logging.getLogger(__name__))
+    return receptor.protocolo.enviar_archivo(str(archivo)), receptor
+
+CONTENIDO = bytes(range(256)) * 20 + b"resto"  # 21 chunks de 256, el último corto
+
+@pytest.mark.parametrize("ventana", [8, 1], ids=["ventana", "stop_and_wait"])
+def test_transferencia_completa(tmp_path, ventana):
+    ok, receptor = _transferir(tmp_path, CONTENIDO, ventana=ventana)
+
+    assert ok
+    assert bytes(receptor.datos) == CONTENIDO
+    assert receptor.mensajes[-1] == "TRANSFER_OK"
+    assert set(receptor.envios.values()) == {1}
+    assert receptor.bytes_sumados > len(CONTENIDO)
+
+@pytest.mark.parametrize("ventana", [8, 1], ids=["ventana", "stop_and_wait"])
+def test_reintento_por_crc(tmp_path, caplog, ventana):
+    caplog.set_level(logging.WARNING)
+    ok, receptor = _transferir(tmp_path, CONTENIDO, ventana=ventana, corromper={3})
+
+    assert ok
+    assert bytes(receptor.datos) == CONTENIDO
+    assert receptor.envios[3] == 2
+    # El reenvío lo dispara el NACK, no un timeout
+    assert "NACK" in caplog.text
+    assert "Timeout" not in caplog.text and "no recibido" not in caplog.text
+
+def test_transferencia_con_mmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_transfer_protocol, "LECTURA_COMPLETA_MAX", 0)
+    ok, receptor = _transferir(tmp_path, CONTENIDO, corromper={5})
+
+    assert ok
+    assert bytes(receptor.datos) == CONTENIDO
+
+def test_archivo_vacio(tmp_path):
+    ok, receptor = _transferir(tmp_path, b"")
+
+    assert ok
+    assert receptor.envios == {}
+    assert receptor.mensajes[-1] == "TRANSFER_OK"
+
+def test_chunk_size_de_configuracion(tmp_path):
+    ok, receptor = _transferir(tmp_path, CONTENIDO, chunk_size=1024)
+
+    assert ok
+    assert len(receptor.envios) == 6
+
+def test_chunk_size_invalido():
+    receptor = ReceptorSimulado(chunk_size=300)
+    with pytest.raises(ValueError):
+        FileTransferProtocol(receptor)
+
+@pytest.mark.parametrize("contenido, esperado", [
+    ("", 4096),  # sin chunk_size: derivado de 115200 baudios
+    ("[TRANSFERENCIA]\nchunk_size = 1024\n", 1024),
+], ids=["por_baudrate", "configurado"])
+def test_chunk_size_desde_config_manager(tmp_path, contenido, esperado):
+    archivo = tmp_path / "camara.conf"
+    archivo.write_text(contenido)
+    receptor = ReceptorSimulado()
+    receptor.config = ConfigManager(str(archivo))
+
+    assert FileTransferProtocol(receptor).chunk_size == esperado